@@ -0,0 +1,91 @@
+import re
+from typing import Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from timeline import Timeline
+
+# Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+# Start / End 拆成 h, m, s 三组，省去逐行 split
+DIALOGUE_PATTERN = re.compile(
+    r"^Dialogue:\s*(\d+),(\d+):(\d+):(\d+\.\d+),(\d+):(\d+):(\d+\.\d+),"
+    r"([^,]*),([^,]*),(\d+),(\d+),(\d+),([^,]*),(.*)$"
+)
+
+
+class Dialogue(NamedTuple):
+    """字幕文件中的一行对白，时间单位为秒"""
+
+    start: float
+    end: float
+    style: str
+    name: str
+
+
+def parse_time(t: str) -> float:
+    """
+    h:mm:ss.ss -> s
+    """
+    return to_seconds(*t.split(":"))
+
+
+def to_seconds(h: str, m: str, s: str) -> float:
+    total_seconds = int(h) * 3600 + int(m) * 60 + (float(s) - 0.01)
+    return max(total_seconds, 0)
+
+
+def parse_line(line: str) -> Optional[Dialogue]:
+    """
+    解析字幕文件中的单行内容，不是对白 (注释、样式等) 时返回 None
+    """
+    if not line.startswith("Dialogue"):
+        return None
+    match = DIALOGUE_PATTERN.match(line.rstrip("\r\n"))
+    if match is None:
+        return None
+    groups = match.groups()
+    return Dialogue(
+        to_seconds(*groups[1:4]), to_seconds(*groups[4:7]), groups[7], groups[8]
+    )
+
+
+def iter_dialogues(lines: Iterable[str]) -> Iterator[Dialogue]:
+    """逐行解析，lines 可以是打开的文件，不需要一次读入整个文件"""
+    for line in lines:
+        dialogue = parse_line(line)
+        if dialogue is not None:
+            yield dialogue
+
+
+def build_timeline(
+    lines: Iterable[str], fps: float, frame_count: int
+) -> Tuple[Timeline, bool]:
+    """
+    由字幕行构建时轴，每个样式一行，重叠的字幕保留先出现的一句
+
+    Args:
+        lines: 字幕文件的行
+        fps: 视频帧率
+        frame_count: 视频帧数
+
+    Returns:
+        (时轴, 是否在视频范围内)。遇到超出视频范围的字幕后，之后的字幕不再加入时轴，
+        但其中新出现的样式仍然建立空行
+    """
+    spans, labels = {}, []
+    in_range = True
+    for idx, dialogue in enumerate(iter_dialogues(lines)):
+        row = spans.setdefault(dialogue.style, [])
+        if not in_range:
+            continue
+        start = int(dialogue.start * fps) + 1
+        end = int(dialogue.end * fps) + 1
+        labels.append(f"{idx + 1} - {dialogue.name}" if dialogue.name else f"{idx + 1}")
+        row.append((start, end, idx))
+        if end > frame_count:
+            in_range = False
+    return Timeline.from_spans(frame_count, spans, labels), in_range
+
+
+def load_timeline(path: str, fps: float, frame_count: int) -> Tuple[Timeline, bool]:
+    """读取 ass 字幕文件并构建时轴，见 build_timeline"""
+    with open(path, "r", encoding="utf-8") as f:
+        return build_timeline(f, fps, frame_count)
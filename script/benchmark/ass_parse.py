@@ -0,0 +1,146 @@
+"""
+ass 字幕解析基准测试：整文件读入 + 逐行 re.match vs ass_timeline 流式解析
+
+在临时目录生成多样式的合成字幕，分别测量解析吞吐和峰值内存 (tracemalloc)
+
+用法: python script/benchmark/ass_parse.py [对白行数] [样式数] [帧率]
+"""
+
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+from ass_timeline import load_timeline
+from timeline import Timeline
+
+HEADER = """[Script Info]
+ScriptType: v4.00+
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+{styles}
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+
+def ass_time(seconds):
+    h, rest = divmod(seconds, 3600)
+    m, s = divmod(rest, 60)
+    return f"{int(h)}:{int(m):02d}:{s:05.2f}"
+
+
+def write_script(path, lines, styles):
+    """每 2.5 秒一句，每 10 行插入一行注释"""
+    names = [f"Style{i}" for i in range(styles)]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            HEADER.format(
+                styles="\n".join(
+                    f"Style: {name},Arial,48,&H00FFFFFF,&H000000FF,&H00000000,"
+                    "&H00000000,0,0,0,0,100,100,0,0,1,2,0,2,10,10,10,1"
+                    for name in names
+                )
+            )
+        )
+        for i in range(lines):
+            start = i * 2.5
+            kind = "Comment" if i % 10 == 9 else "Dialogue"
+            actor = f"Actor{i % 7}" if i % 3 == 0 else ""
+            f.write(
+                f"{kind}: 0,{ass_time(start)},{ass_time(start + 3)},"
+                f"{names[i % styles]},{actor},0,0,0,,"
+                f"{{\\fad(100,100)}}第 {i} 句字幕, with some text\n"
+            )
+    return lines * 2.5 + 10
+
+
+def legacy_timeline(path, fps, frame_count):
+    """重构前 MainWindow.load_subtitle_file 的解析流程"""
+    pattern = r"^(Dialogue|Comment):\s*(\d+),(\d+:\d+:\d+\.\d+),(\d+:\d+:\d+\.\d+),([^,]*),([^,]*),(\d+),(\d+),(\d+),([^,]*),(.*)$"
+
+    def sub_time(t):
+        h, m, s = t.split(":")
+        return max(int(h) * 3600 + int(m) * 60 + (float(s) - 0.01), 0)
+
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    dialogue_list = []
+    for line in content.split("\n"):
+        match = re.match(pattern, line)
+        if match and match.group(1) == "Dialogue":
+            dialogue_list.append(
+                {
+                    "Start": int(sub_time(match.group(3)) * fps) + 1,
+                    "End": int(sub_time(match.group(4)) * fps) + 1,
+                    "Style": match.group(5),
+                    "Name": match.group(6),
+                }
+            )
+    spans, labels = {}, []
+    for idx, dialogue in enumerate(dialogue_list):
+        labels.append(
+            f"{idx + 1} - {dialogue['Name']}" if dialogue["Name"] else f"{idx + 1}"
+        )
+        spans.setdefault(dialogue["Style"], []).append(
+            (dialogue["Start"], dialogue["End"], idx)
+        )
+    return Timeline.from_spans(frame_count, spans, labels)
+
+
+def measure(func, *args):
+    """分两次运行：计时一次，tracemalloc 统计峰值内存一次 (tracemalloc 会拖慢计时)"""
+    s = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - s
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    styles = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    fps = float(sys.argv[3]) if len(sys.argv) > 3 else 60
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "synthetic.ass"
+        duration = write_script(path, lines, styles)
+        frame_count = int(duration * fps)
+        size = path.stat().st_size
+        print(
+            f"{lines} lines, {styles} styles, {size / 2**20:.1f} MiB, "
+            f"{frame_count} frames @ {fps:g} fps"
+        )
+
+        expected, elapsed, peak = measure(legacy_timeline, path, fps, frame_count)
+        print(
+            f"legacy     {elapsed * 1000:8.1f} ms  {lines / elapsed:10.0f} lines/s  "
+            f"peak {peak / 2**20:6.1f} MiB"
+        )
+        (timeline, in_range), elapsed, peak = measure(
+            load_timeline, path, fps, frame_count
+        )
+        print(
+            f"streaming  {elapsed * 1000:8.1f} ms  {lines / elapsed:10.0f} lines/s  "
+            f"peak {peak / 2**20:6.1f} MiB"
+        )
+
+    assert in_range
+    assert timeline.titles == expected.titles and timeline.labels == expected.labels
+    for a, b in zip(
+        zip(timeline.starts, timeline.ends, timeline.ids),
+        zip(expected.starts, expected.ends, expected.ids),
+    ):
+        assert all((x == y).all() for x, y in zip(a, b))
+
+
+if __name__ == "__main__":
+    main()
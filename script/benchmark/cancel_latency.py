@@ -0,0 +1,217 @@
+"""
+流水线取消延迟与空闲 CPU 基准测试
+
+stalled: 写出端阻塞，读取、处理线程在满队列上等待，测量等待期间的 CPU 占用
+         以及从 cancel() 到所有线程退出的时间
+running: 正常处理中途取消，测量从 cancel() 到所有线程退出的时间
+rerun:   同一实例中途取消后再次 run()，应正常完成并生成输出
+dialog:  经真实的 ProgressWindow 运行到 100%，完成后关闭进度窗口不应被当作取消
+
+用法: QT_QPA_PLATFORM=offscreen python script/benchmark/cancel_latency.py [处理线程数] [重复次数]
+"""
+
+import contextlib
+import io
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+from ffmpeg_tools import EncoderConfig
+from inpaint_text import Inpainter
+from inpaint_video import VideoInpainter
+
+WIDTH, HEIGHT, FRAMES = 640, 360, 300
+REGIONS = [{"region": (40, 600, 280, 340), "binary": True}]
+# 合成视频没有音频，经 ffmpeg 编码输出，不依赖 combine_audio
+ENCODER = EncoderConfig(preset="ultrafast")
+
+
+def synthetic_video(path):
+    writer = cv2.VideoWriter(
+        str(path), cv2.VideoWriter_fourcc(*"mp4v"), 30, (WIDTH, HEIGHT)
+    )
+    rng = np.random.default_rng(0)
+    for i in range(FRAMES):
+        frame = rng.integers(0, 255, (HEIGHT, WIDTH, 3), dtype=np.uint8)
+        cv2.putText(frame, f"line {i}", (60, 320), 0, 1.5, (255, 255, 255), 4)
+        writer.write(frame)
+    writer.release()
+
+
+class StallWriter:
+    """write 在 gate 打开前阻塞，模拟卡住的编码器"""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.entered = threading.Event()
+
+    def write(self, frame):
+        self.entered.set()
+        self.gate.wait()
+
+    def release(self):
+        return True
+
+
+class NullWriter:
+    def write(self, frame):
+        pass
+
+    def release(self):
+        return True
+
+
+def make_inpainter(path, workers):
+    time_table = [["1"] * FRAMES]
+    quiet = lambda *args: None
+    # fmt: off
+    vi = VideoInpainter(
+        path, REGIONS, time_table, Inpainter("INPAINT_NS"),
+        quiet, quiet, quiet, quiet, num_workers=workers,
+    )
+    # fmt: on
+    vi.cap = vi.open_capture()
+    vi.fps = vi.cap.get(cv2.CAP_PROP_FPS)
+    vi.total_frame_count = int(vi.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    vi.workers = vi.worker_count()
+    vi.plan_passthrough()
+    return vi
+
+
+def start(vi):
+    thread = threading.Thread(target=vi.run_pipeline, args=((HEIGHT, WIDTH, 3),))
+    thread.start()
+    return thread
+
+
+def cancel_and_join(vi, thread):
+    s = time.perf_counter()
+    vi.cancel()
+    thread.join()
+    return (time.perf_counter() - s) * 1000
+
+
+def stalled(path, workers):
+    vi = make_inpainter(path, workers)
+    vi.out = StallWriter()
+    thread = start(vi)
+    vi.out.entered.wait()
+    time.sleep(1.0)  # 等待各队列填满
+
+    cpu, wall = time.process_time(), time.perf_counter()
+    time.sleep(1.0)
+    idle = (time.process_time() - cpu) / (time.perf_counter() - wall) * 100
+
+    s = time.perf_counter()
+    vi.cancel()
+    vi.out.gate.set()
+    thread.join()
+    latency = (time.perf_counter() - s) * 1000
+    vi.cap.release()
+    return idle, latency
+
+
+def running(path, workers):
+    vi = make_inpainter(path, workers)
+    vi.out = NullWriter()
+    thread = start(vi)
+    time.sleep(0.5)
+    latency = cancel_and_join(vi, thread)
+    vi.cap.release()
+    return latency
+
+
+def output_of(path):
+    return path.with_name(path.stem + "_output.mp4")
+
+
+def rerun(path, workers):
+    """进度超过 10% 时取消，之后在同一实例上重新运行"""
+    quiet = lambda *args: None
+
+    def progress(value):
+        if value > 10 and not cancelled:
+            cancelled.append(value)
+            vi.cancel()
+
+    cancelled = []
+    # fmt: off
+    vi = VideoInpainter(
+        path, REGIONS, [["1"] * FRAMES], Inpainter("INPAINT_NS"),
+        progress, quiet, quiet, quiet, num_workers=workers, encoder=ENCODER,
+    )
+    # fmt: on
+    first = vi.run()
+    assert first["status"] == "Warn" and not output_of(path).exists()
+    s = time.perf_counter()
+    second = vi.run()
+    elapsed = time.perf_counter() - s
+    assert second["status"] == "Success" and output_of(path).exists()
+    output_of(path).unlink()
+    return elapsed
+
+
+def dialog(path, workers):
+    """与 MainWindow.run 相同的连接方式，进度到 100% 时 ProgressWindow 自行关闭"""
+    from PyQt5.QtWidgets import QApplication
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    import main_ui
+
+    # 完成提示是模态对话框，会阻塞事件循环
+    main_ui.QMessageBox.information = lambda *args: None
+    progress = main_ui.ProgressWindow()
+    worker = main_ui.Worker(
+        str(path), REGIONS, Inpainter("INPAINT_NS"), [["1"] * FRAMES], ENCODER
+    )
+    worker.inpaint_video.num_workers = workers
+    results = []
+    worker.update_progress.connect(progress.update_progress)
+    progress.cancel_signal.connect(worker.stop)
+    worker.result_signal.connect(results.append)
+    s = time.perf_counter()
+    worker.start()
+    while not results:
+        app.processEvents()
+        time.sleep(0.01)
+    worker.wait()
+    elapsed = time.perf_counter() - s
+    assert results[0]["status"] == "Success" and output_of(path).exists()
+    output_of(path).unlink()
+    return elapsed
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "synthetic.mp4"
+        synthetic_video(path)
+        print(f"{FRAMES} frames {WIDTH}x{HEIGHT}, {workers} processor threads")
+
+        for i in range(repeat):
+            # 屏蔽处理线程逐帧打印的日志
+            with contextlib.redirect_stdout(io.StringIO()):
+                idle, latency = stalled(path, workers)
+            print(f"stalled  idle CPU {idle:5.1f}%  cancel {latency:7.2f} ms")
+        for i in range(repeat):
+            with contextlib.redirect_stdout(io.StringIO()):
+                latency = running(path, workers)
+            print(f"running  cancel {latency:7.2f} ms")
+        with contextlib.redirect_stdout(io.StringIO()):
+            elapsed = rerun(path, workers)
+        print(f"rerun    Success after cancel {elapsed:6.2f} s")
+        with contextlib.redirect_stdout(io.StringIO()):
+            elapsed = dialog(path, workers)
+        print(f"dialog   Success at 100%      {elapsed:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+解码速度基准测试：cv2.VideoCapture 与 ffmpeg_tools.PipeReader
+
+用法: python script/benchmark/decode_fps.py 视频路径 [最多帧数]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import cv2
+
+sys.path.append(str(Path(__file__).parent.parent))
+from ffmpeg_tools import PipeReader
+
+
+def decode(cap, limit, recycle=None):
+    count = 0
+    s = time.time()
+    while count < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        count += 1
+        if recycle is not None:
+            recycle(frame)
+    elapsed = time.time() - s
+    cap.release()
+    return count, elapsed
+
+
+def main():
+    path = sys.argv[1]
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 10**9
+
+    cases = [
+        ("cv2.VideoCapture", lambda: cv2.VideoCapture(path), False),
+        ("PipeReader", lambda: PipeReader(path), False),
+        ("PipeReader + recycle", lambda: PipeReader(path), True),
+    ]
+    for name, open_capture, recycle in cases:
+        s = time.time()
+        cap = open_capture()
+        opened = time.time() - s
+        count, elapsed = decode(cap, limit, cap.recycle if recycle else None)
+        print(
+            f"{name:<22} {count} frames  {count / elapsed:8.1f} fps  "
+            f"(open {opened * 1000:.0f} ms)"
+        )
+
+
+if __name__ == "__main__":
+    main()
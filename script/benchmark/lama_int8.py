@@ -0,0 +1,55 @@
+"""
+INPAINT_LAMA_INT8 基准测试：int8 量化模型与 fp32 模型的 CPU 耗时和 PSNR
+
+首次运行会量化并生成 big-lama-int8.pt。有 GPU 时请设置 CUDA_VISIBLE_DEVICES=
+让 fp32 模型同样在 CPU 上运行
+
+用法: python script/benchmark/lama_int8.py [big-lama.pt] [帧数]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+sys.path.append(str(Path(__file__).parent.parent))
+import inpaint.lama as lama
+from lama_profile import psnr, subtitle_crops
+
+
+def run(model, crops, shape):
+    model.warmup((shape,))
+    s = time.time()
+    # __call__ 返回补齐到 8 的倍数的结果
+    results = [model(image, mask)[: shape[0], : shape[1]] for image, mask in crops]
+    return results, time.time() - s
+
+
+def main():
+    model_path = sys.argv[1] if len(sys.argv) > 1 else "big-lama.pt"
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    crops = subtitle_crops(count)
+    shape = crops[0][0].shape[:2]
+    print(f"{count} crops {shape}, torch threads {torch.get_num_threads()}")
+
+    fp32 = lama.SimpleLama(model_path)
+    reference, fp32_time = run(fp32, crops, shape)
+
+    s = time.time()
+    int8 = lama.SimpleLama(model_path, quantized=True)
+    print(f"int8 model ready in {time.time() - s:.2f}s")
+    results, int8_time = run(int8, crops, shape)
+
+    quality = sum(
+        psnr(r, ref, mask) for r, ref, (_, mask) in zip(results, reference, crops)
+    ) / count
+    print(f"fp32 {fp32_time / count * 1000:8.1f} ms/frame")
+    print(
+        f"int8 {int8_time / count * 1000:8.1f} ms/frame  "
+        f"speedup {fp32_time / int8_time:.2f}x  PSNR vs fp32 {quality:6.2f} dB"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+shift_expand_mask 基准测试：矢量化膨胀 vs 逐像素循环
+
+用法: python script/benchmark/shift_expand_mask.py
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+import inpaint_mask as maskutil
+
+
+def shift_expand_mask_loop(mask, up=0, down=0, right=0, left=0):
+    """原逐像素实现，作为正确性和速度的参照"""
+    if up + down + right + left == 0:
+        return mask
+
+    height, width = mask.shape[:2]
+    expanded_mask = np.zeros_like(mask)
+    mask_indices = np.argwhere(mask > 0)
+    for row, col in mask_indices:
+        start_row = max(row - up, 0)
+        end_row = min(row + down + 1, height)
+        start_col = max(col - left, 0)
+        end_col = min(col + right + 1, width)
+        expanded_mask[start_row:end_row, start_col:end_col] = 255
+
+    return expanded_mask
+
+
+def subtitle_mask(height=140, width=1600, seed=0):
+    """模拟一行字幕的掩码"""
+    rng = np.random.default_rng(seed)
+    mask = np.zeros((height, width), np.uint8)
+    for x in range(40, width - 80, 36):
+        if rng.random() < 0.9:
+            y = int(rng.integers(40, 60))
+            cv2.putText(mask, "A", (x, y + 40), cv2.FONT_HERSHEY_SIMPLEX, 1.5, 255, 6)
+    return mask
+
+
+def main():
+    mask = subtitle_mask()
+    print(f"mask {mask.shape}, nonzero pixels: {np.count_nonzero(mask)}")
+
+    cases = [
+        {"right": 50},
+        {"left": 7},
+        {"up": 3, "down": 12},
+        {"up": 5, "down": 5, "right": 5, "left": 5},
+        {"up": 400, "right": 3000},
+    ]
+    for kwargs in cases:
+        expected = shift_expand_mask_loop(mask, **kwargs)
+        result = maskutil.shift_expand_mask(mask, **kwargs)
+        assert np.array_equal(expected, result), f"mismatch: {kwargs}"
+
+        loop = timeit.timeit(lambda: shift_expand_mask_loop(mask, **kwargs), number=3)
+        vec = timeit.timeit(lambda: maskutil.shift_expand_mask(mask, **kwargs), number=3)
+        print(
+            f"{str(kwargs):<48} loop {loop / 3 * 1000:9.2f} ms  "
+            f"dilate {vec / 3 * 1000:7.3f} ms  x{loop / vec:8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
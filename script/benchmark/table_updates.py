@@ -0,0 +1,157 @@
+"""
+时轴表格进度更新基准测试：逐帧信号 vs TableProgress 合并批次
+
+处理线程按 [帧率] 为每个选区每帧报告一次进度 (0 为不限速)，统计 UI 线程每秒处理的事件数、
+事件处理总耗时、最长卡顿 (5 ms 心跳定时器的最大延迟)、处理线程报告进度的耗时
+以及处理线程结束后表格追平所需的时间
+
+用法: QT_QPA_PLATFORM=offscreen python script/benchmark/table_updates.py [帧数] [选区数] [帧率]
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from PyQt5.QtWidgets import QApplication
+
+sys.path.append(str(Path(__file__).parent.parent))
+from main_ui import MainWindow, Worker
+from table_progress import TableProgress
+from timeline import Timeline
+
+HEARTBEAT_MS = 5
+
+
+class Emitter(QObject):
+    update_table = pyqtSignal((int, int, str))
+
+
+class FakeWorker:
+    def __init__(self):
+        self.table_progress = TableProgress()
+
+
+def per_cell_update(window, row, col, content=""):
+    """逐单元格更新：每次回调滚动表格并标记一个单元格，作为对照"""
+    window.locate_table(row, col)
+    if row > -1:
+        window.timeline_model.mark_done(row, col, col + 1, content)
+    window.locate_table(row, col)
+
+
+def produce(callback, frames, regions, fps, done):
+    interval = 1 / fps if fps > 0 else 0
+    start = time.perf_counter()
+    for col in range(frames):
+        for row in range(regions):
+            callback(row, col, "")
+        if interval:
+            delay = start + (col + 1) * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    done.set()
+
+
+def measure(app, window, mode, frames, regions, fps):
+    timeline = Timeline(frames, labels=[" "])
+    for i in range(regions):
+        timeline.add_row(str(i + 1))
+        timeline.set(i, 0, frames, 0)
+    window.update_table(timeline)
+
+    events = [0]
+    busy = [0.0]
+    stall = [0.0]
+    last_beat = [time.perf_counter()]
+    done = threading.Event()
+
+    def beat():
+        now = time.perf_counter()
+        stall[0] = max(stall[0], now - last_beat[0] - HEARTBEAT_MS / 1000)
+        last_beat[0] = now
+
+    heartbeat = QTimer()
+    heartbeat.timeout.connect(beat)
+    heartbeat.start(HEARTBEAT_MS)
+
+    if mode == "signal":
+        emitter = Emitter()
+
+        def slot(row, col, content):
+            events[0] += 1
+            t = time.perf_counter()
+            per_cell_update(window, row, col, content)
+            busy[0] += time.perf_counter() - t
+
+        emitter.update_table.connect(slot)
+        callback = emitter.update_table.emit
+        flush_timer = None
+    else:
+        window.worker_thread = FakeWorker()
+        callback = window.worker_thread.table_progress.mark
+
+        def flush():
+            events[0] += 1
+            t = time.perf_counter()
+            window.flush_table_progress()
+            busy[0] += time.perf_counter() - t
+
+        flush_timer = QTimer()
+        flush_timer.timeout.connect(flush)
+        flush_timer.start(Worker.TABLE_FLUSH_MS)
+
+    s = time.perf_counter()
+    producer = threading.Thread(
+        target=produce, args=(callback, frames, regions, fps, done)
+    )
+    producer.start()
+    while not done.is_set():
+        app.processEvents()
+    produced = time.perf_counter()
+    producer.join()
+
+    # 处理线程结束后等待表格追平
+    if flush_timer is not None:
+        flush_timer.stop()
+        flush()
+    app.processEvents()
+    caught_up = time.perf_counter()
+    heartbeat.stop()
+    window.worker_thread = None
+
+    done = window.timeline_model.done
+    filled = sum(int(done.active_mask(row).sum()) for row in range(len(done)))
+    assert filled == frames * regions, (filled, frames * regions)
+    return {
+        "events": events[0] / (caught_up - s),
+        "busy": busy[0] * 1000,
+        "stall": stall[0] * 1000,
+        "worker": (produced - s) * 1000,
+        "lag": (caught_up - produced) * 1000,
+    }
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    regions = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    fps = float(sys.argv[3]) if len(sys.argv) > 3 else 600
+
+    app = QApplication(sys.argv)
+    window = MainWindow()
+    window.total_frames, window.fps = frames, 30
+    rate = f"{fps:g} fps" if fps > 0 else "full speed"
+    print(f"{frames} frames x {regions} regions, worker reports at {rate}")
+
+    for mode in ("signal", "batched"):
+        r = measure(app, window, mode, frames, regions, fps)
+        print(
+            f"{mode:<8} {r['events']:9.1f} UI events/s  UI busy {r['busy']:8.1f} ms  "
+            f"max stall {r['stall']:6.1f} ms  worker {r['worker']:8.1f} ms  "
+            f"catch-up {r['lag']:7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+时轴表示基准测试：逐帧列表 vs Timeline 区间
+
+构建：按字幕行逐帧填充列表 / Timeline.from_spans
+查询：逐帧求需要修复的选区 / Timeline.active 配合 next_change 跳过不变的帧
+
+用法: python script/benchmark/timeline_query.py [帧数] [字幕行数] [样式数]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+from timeline import Timeline
+
+
+def synthetic_spans(frames, lines, styles, seed=0):
+    """生成随机字幕区间 {样式: [(start, end, id)]}"""
+    rng = np.random.default_rng(seed)
+    starts = np.sort(rng.integers(0, frames - 300, lines))
+    lengths = rng.integers(60, 300, lines)
+    spans = {f"style{i}": [] for i in range(styles)}
+    for idx, (start, length) in enumerate(zip(starts, lengths)):
+        spans[f"style{idx % styles}"].append((int(start), int(start + length), idx))
+    return spans
+
+
+def build_lists(frames, spans, labels):
+    table = {}
+    for title, row_spans in spans.items():
+        row = table[title] = [None] * frames
+        for start, end, idx in row_spans:
+            for i in range(start, end):
+                if row[i] is None:
+                    row[i] = labels[idx]
+    return list(table.values())
+
+
+def query_lists(time_table, frames):
+    total = 0
+    for frame in range(frames):
+        total += sum(1 for row in time_table if row[frame])
+    return total
+
+
+def query_timeline(timeline, frames):
+    total = 0
+    frame = 0
+    while frame < frames:
+        # 到下一个变化点之前需要修复的选区不变
+        end = max(int(timeline.next_change(frame)), frame + 1)
+        total += len(timeline.active(frame)) * (min(end, frames) - frame)
+        frame = end
+    return total
+
+
+def timed(func, *args):
+    s = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - s) * 1000
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 216000  # 1 小时 60 fps
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    styles = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    spans = synthetic_spans(frames, lines, styles)
+    labels = [str(i + 1) for i in range(lines)]
+    print(f"{frames} frames, {lines} lines, {styles} styles")
+
+    time_table, build_ms = timed(build_lists, frames, spans, labels)
+    expected, query_ms = timed(query_lists, time_table, frames)
+    print(f"lists     build {build_ms:9.1f} ms  query all frames {query_ms:9.1f} ms")
+
+    timeline, build_ms = timed(Timeline.from_spans, frames, spans, labels)
+    total, query_ms = timed(query_timeline, timeline, frames)
+    intervals = sum(len(starts) for starts in timeline.starts)
+    print(
+        f"timeline  build {build_ms:9.1f} ms  query all frames {query_ms:9.1f} ms  "
+        f"({intervals} intervals)"
+    )
+    assert total == expected, (total, expected)
+
+    probes = np.random.default_rng(1).integers(0, frames, 100000)
+    _, single_ms = timed(lambda: [timeline.active(int(f)) for f in probes[:10000]])
+    _, batch_ms = timed(timeline.next_change, probes)
+    print(
+        f"timeline  active() {single_ms / 10:6.2f} us/query  "
+        f"next_change {batch_ms * 10:6.2f} ns/frame (batch of {len(probes)})"
+    )
+
+
+if __name__ == "__main__":
+    main()
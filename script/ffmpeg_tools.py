@@ -0,0 +1,504 @@
+import re
+import subprocess
+import threading
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+FFMPEG_PATH = Path(__file__).parent.parent / "ffmpeg.exe"
+
+# 源视频编码 -> 重新编码片段所用的编码器及参数，需与源编码一致才能直接拼接。
+# 拼接后只保留第一个片段的全局参数集 (avcC 等)，因此所有片段都在每个关键帧前
+# 携带自己的参数集：重新编码的片段由编码器重复写入，复制的片段见 SEGMENT_COPY_FILTERS
+# fmt: off
+SEGMENT_ENCODERS = {
+    "h264": ["-c:v", "libx264", "-x264-params", "repeat-headers=1"],
+    "hevc": ["-c:v", "libx265", "-x265-params", "repeat-headers=1"],
+    "mpeg4": ["-c:v", "mpeg4", "-q:v", "2", "-bsf:v", "dump_extra=freq=keyframe"],
+}
+# 复制片段时把源视频的参数集写入码流：mp4toannexb 在每个 IDR / IRAP 前插入
+# SPS/PPS (封装为 mkv 时转回长度前缀格式，参数集保留在数据包内)
+SEGMENT_COPY_FILTERS = {
+    "h264": ["-bsf:v", "h264_mp4toannexb"],
+    "hevc": ["-bsf:v", "hevc_mp4toannexb"],
+    "mpeg4": ["-bsf:v", "dump_extra=freq=keyframe"],
+}
+# fmt: on
+# 只能在 IDR 处切分的编码 -> IDR 的 NAL 类型 (filter_units 的 pass_types 格式)。
+# 非 IDR 的关键帧 (h264 的 I 帧 + 恢复点、hevc 的 CRA) 之后的帧仍可能依赖之前的
+# 参考帧状态 (frame_num、MMCO、POC)，从这里开始复制会解码出错
+IDR_NAL_TYPES = {"h264": "5", "hevc": "19-20"}
+SEGMENT_SUFFIX = ".mkv"
+
+
+class VideoInfo(NamedTuple):
+    codec: str
+    pix_fmt: str
+    width: int
+    height: int
+
+
+class EncoderConfig(NamedTuple):
+    """输出视频的编码参数，对应 ffmpeg 的 -c:v / -preset / -crf / -pix_fmt"""
+
+    codec: str = "libx264"
+    preset: str = "medium"
+    crf: int = 20
+    pix_fmt: str = "yuv420p"
+
+    def args(self):
+        # fmt: off
+        return [
+            "-c:v", self.codec,
+            "-preset", self.preset,
+            "-crf", str(self.crf),
+            "-pix_fmt", self.pix_fmt,
+        ]
+        # fmt: on
+
+
+class Segment(NamedTuple):
+    start: int  # 起始帧（含）
+    end: int  # 结束帧（不含）
+    render: bool  # True 解码修复后重新编码，False 直接复制码流
+
+
+class SegmentPlan(NamedTuple):
+    info: VideoInfo
+    segments: List[Segment]
+    reordered: bool  # 源视频是否有 B 帧 (解码顺序与显示顺序不同)
+
+
+def run_ffmpeg(args, **kwargs):
+    return subprocess.run(
+        [str(FFMPEG_PATH), "-hide_banner", *args],
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+        **kwargs,
+    )
+
+
+def probe_video(path) -> Optional[VideoInfo]:
+    """从 ffmpeg -i 的输出中解析第一条视频流的编码、像素格式和尺寸"""
+    output = run_ffmpeg(["-i", str(path)]).stderr
+    match = re.search(
+        r"Stream #\S+.*?: Video: (\w+).*?, (\w+)(?:\(.*?\))?, (\d+)x(\d+)", output
+    )
+    if match is None:
+        return None
+    codec, pix_fmt, width, height = match.groups()
+    return VideoInfo(codec, pix_fmt, int(width), int(height))
+
+
+def plan_segments(frame_active: np.ndarray, keyframes: List[int]) -> List[Segment]:
+    """
+    按关键帧切分视频：含有待修复帧的区间向外扩展到关键帧后重新编码，其余直接复制
+
+    Args:
+        frame_active: 每帧是否有选区需要修复
+        keyframes: 关键帧的帧序号，升序
+
+    Returns:
+        覆盖全部帧的片段列表，相邻片段类型不同
+    """
+    total = len(frame_active)
+    bounds = sorted(set(k for k in keyframes if 0 < k < total) | {0, total})
+
+    segments = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        render = bool(frame_active[start:end].any())
+        if segments and segments[-1].render == render:
+            segments[-1] = segments[-1]._replace(end=end)
+        else:
+            segments.append(Segment(start, end, render))
+    return segments
+
+
+def split_segments(src, plan: SegmentPlan, directory):
+    """
+    按片段边界把源视频的视频码流无损切分为片段文件，一次顺序读取，不依赖 -ss 定位
+
+    segment 复用器按数据包计数切分，片段起点须为 clean_keyframes 中的关键帧，
+    此时解码顺序的包序号与显示顺序的帧序号一致。各片段时间戳从 0 开始，
+    与重新编码的片段一致，由 concat_segments 依次接续
+
+    Returns:
+        与 segments 一一对应的片段路径，需要重新编码的片段之后会被覆盖
+    """
+    directory = Path(directory)
+    segments = plan.segments
+    boundaries = ",".join(str(segment.start) for segment in segments[1:])
+    # fmt: off
+    args = [
+        "-y",
+        "-i", str(src),
+        "-map", "0:v:0", "-an",
+        "-c", "copy", *SEGMENT_COPY_FILTERS[plan.info.codec],
+        "-f", "segment", "-segment_format", "matroska",
+        "-reset_timestamps", "1",
+    ]
+    # fmt: on
+    if boundaries:
+        args += ["-segment_frames", boundaries]
+    args.append(str(directory / f"%05d{SEGMENT_SUFFIX}"))
+    result = run_ffmpeg(args)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg split failed: {result.stderr[-500:]}")
+
+    paths = [directory / f"{i:05d}{SEGMENT_SUFFIX}" for i in range(len(segments))]
+    if not all(path.exists() for path in paths):
+        raise RuntimeError("ffmpeg split produced fewer segments than planned")
+    return paths
+
+
+def concat_segments(paths, dst, audio_source=None):
+    """
+    用 concat demuxer 无损拼接片段
+
+    Args:
+        paths: 片段路径
+        dst: 输出路径
+        audio_source: 不为 None 时同时复制该文件的音频（若有）
+    """
+    list_path = Path(dst).with_suffix(".txt")
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in paths:
+            f.write(f"file '{Path(path).resolve().as_posix()}'\n")
+    # fmt: off
+    args = [
+        "-y",
+        "-f", "concat", "-safe", "0",
+        "-i", str(list_path),
+    ]
+    # fmt: on
+    if audio_source is not None:
+        args += ["-i", str(audio_source), "-map", "0:v", "-map", "1:a?"]
+    args += ["-c", "copy", str(dst)]
+    try:
+        result = run_ffmpeg(args)
+    finally:
+        list_path.unlink()
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg concat failed: {result.stderr[-500:]}")
+
+
+class PipeWriter:
+    """
+    通过管道把 BGR 帧送入 ffmpeg 编码，接口与 cv2.VideoWriter 的 write / release 相同
+
+    Args:
+        path: 输出路径
+        size: (宽, 高)
+        fps: 帧率
+        output_args: 编码及输出参数
+        audio_source: 不为 None 时在同一个 ffmpeg 进程中复制该文件的音频（若有）
+    """
+
+    def __init__(self, path, size, fps, output_args, audio_source=None):
+        width, height = size
+        # fmt: off
+        command = [
+            str(FFMPEG_PATH), "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "bgr24",
+            "-s", f"{width}x{height}",
+            "-r", repr(fps),
+            "-i", "-",
+        ]
+        # fmt: on
+        if audio_source is not None:
+            command += ["-i", str(audio_source), "-map", "0:v", "-map", "1:a?"]
+            command += ["-c:a", "copy"]
+        command += [*output_args, str(path)]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        self.broken = False
+
+    def write(self, frame):
+        # ffmpeg 异常退出后丢弃后续帧，由 release 报告失败，避免写入线程崩溃
+        if self.broken:
+            return
+        try:
+            self.process.stdin.write(np.ascontiguousarray(frame).data)
+        except OSError:
+            self.broken = True
+
+    def release(self):
+        """结束编码，返回是否成功"""
+        if self.process.stdin:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                self.broken = True
+        return self.process.wait() == 0 and not self.broken
+
+
+class SegmentWriter(PipeWriter):
+    """把帧编码为与源视频相同编码和像素格式的片段"""
+
+    def __init__(self, path, plan: SegmentPlan, fps: float, crf: int = 18):
+        info = plan.info
+        quality = [] if info.codec == "mpeg4" else ["-crf", str(crf)]
+        # 源视频没有 B 帧时片段也不使用，否则解码延迟不同，拼接处的 dts 会重叠
+        bframes = [] if plan.reordered else ["-bf", "0"]
+        output_args = [
+            *SEGMENT_ENCODERS[info.codec],
+            *quality,
+            *bframes,
+            "-pix_fmt",
+            info.pix_fmt,
+            "-f",
+            "matroska",
+        ]
+        super().__init__(path, (info.width, info.height), fps, output_args)
+
+
+def read_packets(path, bsf=None) -> List[Tuple[float, bool]]:
+    """
+    只解封装不解码，按解码顺序返回第一条视频流每个数据包的 (显示时间 (秒), 是否关键帧)
+
+    framecrc 每行一个数据包: 流, dts, pts, 时长, 大小, 校验和，
+    非关键帧在最后附加 F=标志
+
+    Args:
+        bsf: 输出前应用的码流过滤器，被过滤为空的数据包不会出现在结果中
+    """
+    # fmt: off
+    args = [
+        "-loglevel", "error",
+        "-i", str(path),
+        "-map", "0:v:0", "-c", "copy",
+    ]
+    # fmt: on
+    if bsf is not None:
+        args += ["-bsf:v", bsf]
+    args += ["-f", "framecrc", "-"]
+    output = run_ffmpeg(args).stdout
+    match = re.search(r"#tb 0: (\d+)/(\d+)", output)
+    if match is None:
+        return []
+    num, den = (int(v) for v in match.groups())
+    packets = []
+    for line in output.splitlines():
+        fields = [field.strip() for field in line.split(",")]
+        if len(fields) < 6 or fields[0].startswith("#"):
+            continue
+        flags = [int(f[2:], 16) for f in fields[6:] if f.startswith("F=")]
+        key = not flags or bool(flags[0] & 1)
+        packets.append((int(fields[2]) * num / den, key))
+    return packets
+
+
+def frame_timestamps(path) -> List[float]:
+    """第一条视频流每帧的显示时间 (秒)，按显示顺序排列"""
+    return sorted(pts for pts, _ in read_packets(path))
+
+
+def clean_keyframes(packets: List[Tuple[float, bool]]) -> List[int]:
+    """
+    可以作为片段起点的关键帧的帧序号 (显示顺序)
+
+    要求之前的数据包都在它之前显示，且到下一个关键帧为止没有显示时间更早的前导帧。
+    开放 GOP 的关键帧 (如 x265 默认的 CRA) 之后的前导帧参考上一个 GOP，
+    在这里切分会使前导帧无法解码，因此不作为切分点
+
+    Args:
+        packets: read_packets 的结果
+    """
+    order = sorted(range(len(packets)), key=lambda i: packets[i][0])
+    display = {index: n for n, index in enumerate(order)}
+    positions = [i for i, (_, key) in enumerate(packets) if key]
+    keyframes = []
+    for k, pos in enumerate(positions):
+        end = positions[k + 1] if k + 1 < len(positions) else len(packets)
+        pts = packets[pos][0]
+        leading = any(t < pts for t, _ in packets[pos + 1 : end])
+        if display[pos] == pos and not leading:
+            keyframes.append(pos)
+    return keyframes
+
+
+def keyframe_segments(path, frame_active: np.ndarray) -> Optional[SegmentPlan]:
+    """
+    求分段渲染计划，源视频编码不支持或无法切分时返回 None
+
+    帧数以数据包数为准：cv2 的 CAP_PROP_FRAME_COUNT 由时长估算，
+    起始时间不为 0 等情况下会偏多，多出的部分截去，不足的部分按需要修复处理
+    """
+    info = probe_video(path)
+    if info is None or info.codec not in SEGMENT_ENCODERS:
+        return None
+    packets = read_packets(path)
+    if info.codec in IDR_NAL_TYPES:
+        bsf = f"filter_units=pass_types={IDR_NAL_TYPES[info.codec]}"
+        idr = {pts for pts, _ in read_packets(path, bsf)}
+        packets = [(pts, key and pts in idr) for pts, key in packets]
+    keyframes = clean_keyframes(packets)
+    if not keyframes or keyframes[0] != 0:
+        return None
+    active = np.ones(len(packets), bool)
+    length = min(len(packets), len(frame_active))
+    active[:length] = frame_active[:length]
+    reordered = any(a[0] > b[0] for a, b in zip(packets, packets[1:]))
+    return SegmentPlan(info, plan_segments(active, keyframes), reordered)
+
+
+class PipeReader:
+    """
+    ffmpeg 多线程解码，经管道读取 rawvideo，可替代 cv2.VideoCapture
+
+    read 直接读入预分配的帧缓冲；帧序号和时间戳来自容器中的数据包时间，
+    以 passthrough 模式输出，不会因帧率换算而丢帧或重复帧。
+    支持 get / set(CAP_PROP_POS_FRAMES) / read / release / isOpened
+
+    Args:
+        path: 视频路径
+        threads: 解码线程数，0 由 ffmpeg 自动选择
+    """
+
+    MAX_BUFFERS = 32  # 缓冲池最多持有的帧缓冲数
+
+    def __init__(self, path, threads=0):
+        self.path = path
+        self.threads = threads
+        self.info = probe_video(path)
+        self.timestamps = frame_timestamps(path) if self.info else []
+        self.frame_bytes = self.info.width * self.info.height * 3 if self.info else 0
+        self.fps = self._fps()
+
+        self.process = None
+        self.pos = 0  # 下一帧的序号
+        self.last_pos = -1  # 上一次 read 返回的帧序号
+        # 写入线程用完的帧缓冲，read 优先复用；_owned 持有引用，id 不会被复用
+        self._free = []
+        self._owned = {}
+        self._lock = threading.Lock()
+        if self.timestamps:
+            self._start(0)
+
+    def _fps(self):
+        if len(self.timestamps) < 2:
+            return 0.0
+        duration = self.timestamps[-1] - self.timestamps[0]
+        if duration <= 0:
+            return 0.0
+        return round((len(self.timestamps) - 1) / duration, 6)
+
+    def _start(self, frame_idx):
+        """从 frame_idx 开始解码，精确定位到该帧"""
+        self._stop()
+        seek = []
+        if frame_idx > 0:
+            # 定位到前一帧与该帧之间，解码后丢弃之前的帧。timestamps 与 -ss
+            # 都相对于文件的起始时间，第一帧不在 0 时也不能减去 t[0]
+            t = self.timestamps
+            offset = (t[frame_idx - 1] + t[frame_idx]) / 2
+            seek = ["-ss", f"{offset:.6f}"]
+        # fmt: off
+        command = [
+            str(FFMPEG_PATH), "-hide_banner", "-loglevel", "error",
+            "-threads", str(self.threads),
+            *seek,
+            "-i", str(self.path),
+            "-map", "0:v:0",
+            "-vsync", "passthrough",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-",
+        ]
+        # fmt: on
+        self.process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stdin=subprocess.DEVNULL,
+            bufsize=self.frame_bytes,
+        )
+        self.pos = frame_idx
+
+    def _stop(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            self.process.stdout.close()
+            self.process = None
+
+    def isOpened(self):
+        return self.process is not None
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.info.width if self.info else 0
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.info.height if self.info else 0
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return len(self.timestamps)
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.pos
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return self.timestamp(self.last_pos) * 1000
+        return 0
+
+    def set(self, prop, value):
+        if prop != cv2.CAP_PROP_POS_FRAMES or not self.timestamps:
+            return False
+        frame_idx = int(value)
+        if frame_idx != self.pos:
+            self._start(min(max(frame_idx, 0), len(self.timestamps) - 1))
+        return True
+
+    def timestamp(self, frame_idx):
+        """帧的显示时间 (秒)，以第一帧为 0"""
+        if frame_idx < 0 or frame_idx >= len(self.timestamps):
+            return 0.0
+        return self.timestamps[frame_idx] - self.timestamps[0]
+
+    def read(self, image=None):
+        """
+        读取下一帧
+
+        Args:
+            image: 预分配的 (高, 宽, 3) uint8 连续数组，为 None 时使用内部缓冲池
+
+        Returns:
+            (是否成功, 帧)
+        """
+        if self.process is None:
+            return False, None
+        if image is None:
+            image = self._buffer()
+
+        view = memoryview(image.reshape(-1))
+        filled = 0
+        while filled < self.frame_bytes:
+            n = self.process.stdout.readinto(view[filled:])
+            if not n:
+                return False, None
+            filled += n
+
+        self.last_pos = self.pos
+        self.pos += 1
+        return True, image
+
+    def _buffer(self):
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+        frame = np.empty((self.info.height, self.info.width, 3), np.uint8)
+        with self._lock:
+            if len(self._owned) < self.MAX_BUFFERS:
+                self._owned[id(frame)] = frame
+        return frame
+
+    def recycle(self, frame):
+        """归还不再使用的帧缓冲；非本对象分配的数组直接忽略"""
+        with self._lock:
+            if self._owned.get(id(frame)) is frame:
+                self._free.append(frame)
+
+    def release(self):
+        self._stop()
+        with self._lock:
+            self._free.clear()
+            self._owned.clear()
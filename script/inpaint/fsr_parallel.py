@@ -1,76 +1,171 @@
+import os
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
 
 import cv2
 import numpy as np
 
 
-class SharedNDArray:
-    def __init__(self, arr):
-        self.arr = arr
-        self.lock = threading.Lock()
-
-
-def inpaint_block(args):
-    shared_src, shared_mask, shared_result, y_start, y_end, x_start, x_end, overlap = (
-        args
-    )
-
+class TileStats(NamedTuple):
+    total: int
+    processed: int
+    skipped: int
+
+
+def default_tile_config(cpu_count=None):
+    """
+    根据 CPU 核数确定线程数、分块大小和重叠宽度
+
+    核数少时用大块减少调度和重叠开销，核数多时用小块保证负载均衡
+    """
+    cores = cpu_count or os.cpu_count() or 1
+    if cores <= 4:
+        block_size = 128
+    elif cores <= 8:
+        block_size = 96
+    else:
+        block_size = 64
+    return cores, block_size, block_size // 4
+
+
+def inpaint_block(
+    src,
+    mask,
+    result,
+    y_start,
+    y_end,
+    x_start,
+    x_end,
+    overlap,
+    algorithm=cv2.xphoto.INPAINT_FSR_FAST,
+):
+    """
+    修复单个分块并写回 result
+
+    src 和 mask 只读，各分块写入 result 的区域互不重叠，因此无需加锁
+    """
     # Define extended region with overlap
     y_start_ext = max(0, y_start - overlap)
-    y_end_ext = min(shared_src.arr.shape[0], y_end + overlap)
+    y_end_ext = min(src.shape[0], y_end + overlap)
     x_start_ext = max(0, x_start - overlap)
-    x_end_ext = min(shared_src.arr.shape[1], x_end + overlap)
+    x_end_ext = min(src.shape[1], x_end + overlap)
 
     # Extract extended block from source and mask
-    block = shared_src.arr[y_start_ext:y_end_ext, x_start_ext:x_end_ext]
-    mask_block = shared_mask.arr[y_start_ext:y_end_ext, x_start_ext:x_end_ext]
+    block = src[y_start_ext:y_end_ext, x_start_ext:x_end_ext]
+    mask_block = mask[y_start_ext:y_end_ext, x_start_ext:x_end_ext]
 
     # Perform inpainting on the extended block
-    cv2.xphoto.inpaint(block, mask_block, block, cv2.xphoto.INPAINT_FSR_FAST)
-
-    # Calculate the actual overlap for trimming, especially near the edges
-    y_overlap_top = y_start - y_start_ext
-    y_overlap_bottom = y_end_ext - y_end
-    x_overlap_left = x_start - x_start_ext
-    x_overlap_right = x_end_ext - x_end
+    inpainted = block.copy()
+    cv2.xphoto.inpaint(block, mask_block, inpainted, algorithm)
 
     # Insert the inpainted result back into the result array, trimming the overlap
-    with shared_result.lock:
-        shared_result.arr[y_start:y_end, x_start:x_end] = block[
-            y_overlap_top : block.shape[0] - y_overlap_bottom,
-            x_overlap_left : block.shape[1] - x_overlap_right,
-        ]
+    result[y_start:y_end, x_start:x_end] = inpainted[
+        y_start - y_start_ext : y_end - y_start_ext,
+        x_start - x_start_ext : x_end - x_start_ext,
+    ]
 
 
-def fsr(src, mask, num_threads=16, block_size=64, overlap=16):
-    height, width = src.shape[:2]
-
-    # Create shared arrays
-    shared_src = SharedNDArray(src)
-    shared_mask = SharedNDArray(cv2.bitwise_not(mask))
-    shared_result = SharedNDArray(np.zeros_like(src))
-
-    # Generate block coordinates
-    blocks = [
-        (
-            shared_src,
-            shared_mask,
-            shared_result,
-            y,
-            min(y + block_size, height),
-            x,
-            min(x + block_size, width),
-            overlap,
+def plan_tiles(fill_mask, block_size=64, overlap=16):
+    """
+    划分分块，只保留扩展窗口内含有待修复像素的块
+
+    Args:
+        fill_mask: 待修复掩码，非零处需要修复
+        block_size: 分块大小
+        overlap: 分块向四周扩展的像素数
+
+    Returns:
+        (需要修复的分块 [(y_start, y_end, x_start, x_end)], TileStats)
+    """
+    height, width = fill_mask.shape[:2]
+    ys = np.arange(0, height, block_size)
+    xs = np.arange(0, width, block_size)
+    y_start, x_start = np.meshgrid(ys, xs, indexing="ij")
+    y_end = np.minimum(y_start + block_size, height)
+    x_end = np.minimum(x_start + block_size, width)
+
+    # 积分图一次求出所有扩展窗口内的待修复像素数
+    integral = cv2.integral((fill_mask > 0).astype(np.uint8))
+    y0 = np.maximum(0, y_start - overlap)
+    y1 = np.minimum(height, y_end + overlap)
+    x0 = np.maximum(0, x_start - overlap)
+    x1 = np.minimum(width, x_end + overlap)
+    counts = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+
+    coords = np.stack([y_start, y_end, x_start, x_end], axis=-1).reshape(-1, 4)
+    active = counts.reshape(-1) > 0
+    tiles = [tuple(c) for c in coords[active].tolist()]
+    stats = TileStats(len(coords), len(tiles), len(coords) - len(tiles))
+    return tiles, stats
+
+
+class TileExecutor:
+    """
+    常驻的分块修复线程池，跨帧复用，避免每帧创建和销毁线程
+    """
+
+    def __init__(self, num_threads=None, block_size=None, overlap=None):
+        cores, default_block, default_overlap = default_tile_config()
+        self.num_threads = num_threads or cores
+        self.block_size = block_size or default_block
+        self.overlap = default_overlap if overlap is None else overlap
+        self.last_stats = TileStats(0, 0, 0)
+
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.num_threads, thread_name_prefix="FSRTile"
         )
-        for y in range(0, height, block_size)
-        for x in range(0, width, block_size)
-    ]
 
-    # Process blocks using ThreadPoolExecutor
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        futures = [executor.submit(inpaint_block, block) for block in blocks]
-        for future in as_completed(futures):
+    def fsr(self, src, mask, return_stats=False):
+        """
+        分块并行 FSR 修复，不含掩码像素的分块直接复制原图
+
+        Args:
+            src: 输入图像
+            mask: 文字掩码，非零处需要修复
+            return_stats: 为 True 时同时返回 TileStats
+
+        Returns:
+            修复后图像，return_stats 为 True 时返回 (图像, TileStats)
+        """
+        tiles, stats = plan_tiles(mask, self.block_size, self.overlap)
+        self.last_stats = stats
+
+        # FSR 掩码中 0 为待修复像素；未修复的分块直接沿用原图
+        valid_mask = cv2.bitwise_not(mask)
+        result = src.copy()
+
+        futures = [
+            self._pool.submit(
+                inpaint_block, src, valid_mask, result, y0, y1, x0, x1, self.overlap
+            )
+            for y0, y1, x0, x1 in tiles
+        ]
+        for future in futures:
             future.result()  # Ensures that exceptions are raised if any
 
-    return shared_result.arr
+        if return_stats:
+            return result, stats
+        return result
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+
+def get_default_executor():
+    """进程内共享的 TileExecutor，首次使用时创建"""
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = TileExecutor()
+        return _default_executor
+
+
+def fsr(src, mask, executor=None, return_stats=False):
+    """使用 executor（默认共享实例）进行分块并行 FSR 修复"""
+    executor = executor or get_default_executor()
+    return executor.fsr(src, mask, return_stats=return_stats)
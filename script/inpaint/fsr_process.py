@@ -0,0 +1,129 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from inpaint.fsr_parallel import TileStats, inpaint_block, plan_tiles
+
+# 子进程中已打开的共享内存 {name: SharedMemory}
+_attached = {}
+
+
+def _attach(specs):
+    """在子进程中按名称映射共享内存，关闭不再使用的旧映射"""
+    names = {name for name, _, _ in specs}
+    for name in list(_attached):
+        if name not in names:
+            _attached.pop(name).close()
+
+    arrays = []
+    for name, shape, dtype in specs:
+        if name not in _attached:
+            _attached[name] = shared_memory.SharedMemory(name=name)
+        arrays.append(np.ndarray(shape, dtype=dtype, buffer=_attached[name].buf))
+    return arrays
+
+
+def _inpaint_tiles(specs, tiles, overlap):
+    src, mask, result = _attach(specs)
+    for y0, y1, x0, x1 in tiles:
+        inpaint_block(
+            src, mask, result, y0, y1, x0, x1, overlap, cv2.xphoto.INPAINT_FSR_BEST
+        )
+    return len(tiles)
+
+
+class SharedArray:
+    """按需扩容的共享内存数组，shape 变化时只在容量不足时重新分配"""
+
+    def __init__(self):
+        self.shm = None
+
+    def view(self, shape, dtype=np.uint8):
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if self.shm is None or self.shm.size < nbytes:
+            self.release()
+            self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        self.shape, self.dtype = shape, np.dtype(dtype)
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf)
+
+    def spec(self):
+        return self.shm.name, self.shape, self.dtype.str
+
+    def release(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class ProcessTileExecutor:
+    """
+    常驻的 FSR_BEST 分块修复进程池 (INPAINT_FSR_BEST_PARA)
+
+    src、mask、result 放在 multiprocessing.shared_memory 中并跨帧复用，
+    每帧只向子进程发送分块坐标，图像数据不经过 pickle。
+
+    误差：每个分块只能看到 block_size + 2 * overlap 范围内的上下文，
+    结果与整图单次 FSR_BEST 并非逐像素一致。默认参数下修复像素的平均
+    绝对误差在 1 (0-255) 以内，分块接缝附近个别像素可能相差较大。
+    可用 benchmark/fsr_best_para.py 复现。
+    """
+
+    def __init__(self, num_workers=None, block_size=128, overlap=32):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.block_size = block_size
+        self.overlap = overlap
+        self.last_stats = TileStats(0, 0, 0)
+
+        self._pool = ProcessPoolExecutor(max_workers=self.num_workers)
+        self._src = SharedArray()
+        self._mask = SharedArray()
+        self._result = SharedArray()
+
+    def fsr_best(self, src, mask, return_stats=False):
+        """
+        分块并行 FSR_BEST 修复
+
+        Args:
+            src: 输入图像
+            mask: 文字掩码，非零处需要修复
+            return_stats: 为 True 时同时返回 TileStats
+
+        Returns:
+            修复后图像，return_stats 为 True 时返回 (图像, TileStats)
+        """
+        tiles, stats = plan_tiles(mask, self.block_size, self.overlap)
+        self.last_stats = stats
+
+        # 与 INPAINT_FSR_BEST 相同：FSR 掩码 0 为待修复像素，且先抹去待修复像素
+        shared_mask = self._mask.view(mask.shape)
+        cv2.bitwise_not(mask, dst=shared_mask)
+        shared_src = self._src.view(src.shape)
+        shared_src[:] = 0
+        cv2.copyTo(src, shared_mask, shared_src)
+        shared_result = self._result.view(src.shape)
+        shared_result[:] = src
+
+        # 每个进程一批分块，减少进程间通信次数
+        specs = [self._src.spec(), self._mask.spec(), self._result.spec()]
+        batches = [tiles[i :: self.num_workers] for i in range(self.num_workers)]
+        futures = [
+            self._pool.submit(_inpaint_tiles, specs, batch, self.overlap)
+            for batch in batches
+            if batch
+        ]
+        for future in futures:
+            future.result()  # Ensures that exceptions are raised if any
+
+        result = shared_result.copy()
+        if return_stats:
+            return result, stats
+        return result
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+        for shared in (self._src, self._mask, self._result):
+            shared.release()
@@ -1,10 +1,15 @@
 import os
 import subprocess
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
 
 import cv2
 import numpy as np
 import torch
 
+from inpaint.fsr_parallel import TileStats
+
 
 def get_image(image):
     img = image.copy()
@@ -72,6 +77,78 @@ def prepare_img_and_mask(image, mask, device, pad_out_to_modulo=8, scale_factor=
     return out_image, out_mask
 
 
+def symmetric_index(i, size):
+    """np.pad(mode="symmetric") 中越界下标 i 对应的源下标"""
+    i %= 2 * size
+    return i if i < size else 2 * size - 1 - i
+
+
+class InputBuffers:
+    """
+    按 (batch, 高, 宽) 缓存预分配的输入张量，归一化、HWC->CHW 和对称补齐
+    直接写入张量，不产生中间 NumPy 数组
+    """
+
+    MAX_CACHED = 8
+
+    def __init__(self, device, memory_format=torch.contiguous_format):
+        self.device = device
+        self.memory_format = memory_format
+        self._buffers = OrderedDict()
+
+    def get(self, batch, height, width):
+        key = (batch, height, width)
+        if key in self._buffers:
+            self._buffers.move_to_end(key)
+        else:
+            self._buffers[key] = (
+                torch.empty(
+                    (batch, 3, height, width),
+                    device=self.device,
+                    memory_format=self.memory_format,
+                ),
+                torch.empty(
+                    (batch, 1, height, width),
+                    device=self.device,
+                    memory_format=self.memory_format,
+                ),
+            )
+            if len(self._buffers) > self.MAX_CACHED:
+                self._buffers.popitem(last=False)
+        return self._buffers[key]
+
+    def prepare(self, images, masks, pad_out_to_modulo=8):
+        """
+        将 uint8 图像和掩码写入缓存张量
+
+        Returns:
+            (图像张量 [N, 3, H, W] 0-1, 掩码张量 [N, 1, H, W] 0/1)，下次调用时会被覆盖
+        """
+        height = max(ceil_modulo(image.shape[0], pad_out_to_modulo) for image in images)
+        width = max(ceil_modulo(image.shape[1], pad_out_to_modulo) for image in images)
+        image_t, mask_t = self.get(len(images), height, width)
+
+        for i, (image, mask) in enumerate(zip(images, masks)):
+            h, w = image.shape[:2]
+            # from_numpy 共享内存，copy_ 时完成 uint8 -> float32 和 HWC -> CHW
+            image_t[i, :, :h, :w].copy_(torch.from_numpy(image).permute(2, 0, 1))
+            image_t[i, :, :h, :w].div_(255)
+            mask_t[i, 0, :h, :w].copy_(torch.from_numpy(mask))
+            mask_t[i, 0, :h, :w].clamp_(max=1)
+            for tensor in (image_t[i], mask_t[i]):
+                self.pad_symmetric(tensor, h, w)
+        return image_t, mask_t
+
+    @staticmethod
+    def pad_symmetric(tensor, h, w):
+        """将 [C, H, W] 张量左上角 h x w 的内容对称补齐到整个张量"""
+        _, height, width = tensor.shape
+        for row in range(h, height):
+            tensor[:, row, :w].copy_(tensor[:, symmetric_index(row, h), :w])
+        for col in range(w, width):
+            tensor[:, :, col].copy_(tensor[:, :, symmetric_index(col, w)])
+
+
 def run_command(command, status_message):
     """Runs a command and shows terminal window"""
     print(status_message)
@@ -109,8 +186,89 @@ def download_model():
         print(f"从原始 URL 下载失败: {e}")
 
 
+class CpuProfile(NamedTuple):
+    """CPU 推理配置"""
+
+    freeze: bool = True  # torch.jit.freeze + optimize_for_inference
+    channels_last: bool = True  # 权重和输入使用 channels_last 内存布局
+    bf16: bool = False  # bfloat16 autocast
+    intra_op_threads: Optional[int] = None  # None 保持 torch 默认
+    inter_op_threads: Optional[int] = None
+    warmup_iterations: int = 2  # 每个预期尺寸预先推理的次数，0 不预热
+
+
+# 可在 config.json 的 lama_profile 中选择，仅在 CPU 上生效
+PROFILES = {
+    "default": None,
+    "cpu": CpuProfile(),
+    "cpu_bf16": CpuProfile(bf16=True),
+}
+
+
+def int8_model_path(model_path):
+    """int8 模型的缓存路径: big-lama.pt -> big-lama-int8.pt"""
+    root, ext = os.path.splitext(model_path)
+    return f"{root}-int8{ext}"
+
+
+def calibration_samples(count=8, height=184, width=640, seed=0):
+    """合成的字幕区域样本（平滑背景 + 文字掩码），用于 int8 量化校准"""
+    rng = np.random.default_rng(seed)
+    samples = []
+    for i in range(count):
+        noise = rng.integers(0, 255, (height // 8, width // 8, 3), dtype=np.uint8)
+        image = cv2.resize(noise, (width, height), interpolation=cv2.INTER_CUBIC)
+        mask = np.zeros((height, width), np.uint8)
+        cv2.putText(mask, f"subtitle {i}", (20, 120), 0, 2, 255, 10)
+        samples.append((image, mask))
+    return samples
+
+
+def is_quantized(model) -> bool:
+    """TorchScript 模型中是否包含 int8 量化算子"""
+    return "quantized::" in str(model.inlined_graph)
+
+
+def quantize_model(model, samples):
+    """
+    图模式 int8 训练后量化：卷积等算子量化为 int8，FFT 等其余算子保持 fp32
+
+    LaMa 几乎全部由卷积构成，动态量化只覆盖 Linear/LSTM，对 LaMa 相当于
+    fp32，因此只使用带校准的静态量化，失败时抛出 RuntimeError
+    """
+    from torch.ao.quantization import get_default_qconfig, quantize_jit
+
+    buffers = InputBuffers(torch.device("cpu"))
+
+    def calibrate(model, samples):
+        with torch.no_grad():
+            for image, mask in samples:
+                model(*buffers.prepare([image], [mask]))
+
+    try:
+        qconfig = get_default_qconfig("fbgemm")
+        quantized = quantize_jit(model, {"": qconfig}, calibrate, [samples])
+    except Exception as e:
+        raise RuntimeError(f"lama int8 quantization failed: {e}") from e
+    if not is_quantized(quantized):
+        raise RuntimeError("lama int8 quantization produced no quantized operators")
+    return quantized
+
+
 class SimpleLama:
-    def __init__(self, model_path="big-lama.pt") -> None:
+    def __init__(
+        self,
+        model_path="big-lama.pt",
+        profile: Optional[CpuProfile] = None,
+        quantized: bool = False,
+    ) -> None:
+        """
+        Args:
+            model_path: TorchScript 模型路径，不存在时自动下载
+            profile: CPU 推理配置，仅在 CPU 上生效
+            quantized: 使用 int8 量化模型（仅 CPU），首次使用时由 model_path
+                量化生成并缓存为 int8_model_path(model_path)，此时忽略 profile
+        """
 
         if not os.path.exists(model_path):
             try:
@@ -120,18 +278,312 @@ class SimpleLama:
                     f"lama model not found: {model_path}\nplease download from https://github.com/enesmsahin/simple-lama-inpainting/releases/download/v0.1.0/big-lama.pt"
                 )
 
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.model = torch.jit.load(model_path, map_location=device)
-        self.model.eval()
-        self.model.to(device)
+        if quantized:
+            device = torch.device("cpu")  # 量化算子只支持 CPU
+            self.model = self.load_int8(model_path)
+            profile = None
+        else:
+            device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+            self.model = torch.jit.load(model_path, map_location=device)
+            self.model.eval()
+            self.model.to(device)
         self.device = device
 
-    def __call__(self, image, mask):
-        image, mask = prepare_img_and_mask(image, mask, self.device)
+        self.profile = profile if device.type == "cpu" else None
+        self.memory_format = torch.contiguous_format
+        if self.profile is not None:
+            self.apply_cpu_profile(self.profile)
+
+        self.input_buffers = InputBuffers(device, self.memory_format)
+        self._lock = threading.Lock()  # 输入张量复用，推理需串行
+        self.last_tile_stats = TileStats(0, 0, 0)  # 上次 inpaint_tiled 的分块统计
+
+    @staticmethod
+    def load_int8(model_path):
+        """读取缓存的 int8 模型，不存在时量化生成并保存，量化失败时抛出 RuntimeError"""
+        cache_path = int8_model_path(model_path)
+        model = None
+        if os.path.exists(cache_path):
+            model = torch.jit.load(cache_path, map_location="cpu")
+            # 旧版本在静态量化失败时缓存了未量化的模型，重新生成
+            if not is_quantized(model):
+                print(f"{cache_path} is not quantized, regenerating")
+                model = None
+        if model is None:
+            print(f"quantizing {model_path} to int8...")
+            model = torch.jit.load(model_path, map_location="cpu")
+            model.eval()
+            model = quantize_model(model, calibration_samples())
+            torch.jit.save(model, cache_path)
+            print(f"int8 model saved: {cache_path}")
+        model.eval()
+        return model
+
+    def apply_cpu_profile(self, profile: CpuProfile) -> None:
+        if profile.intra_op_threads:
+            torch.set_num_threads(profile.intra_op_threads)
+        if profile.inter_op_threads:
+            try:
+                torch.set_num_interop_threads(profile.inter_op_threads)
+            except RuntimeError as e:  # 只能在首次并行计算前设置
+                print(f"set_num_interop_threads failed: {e}")
+
+        if profile.channels_last:
+            self.model = self.model.to(memory_format=torch.channels_last)
+            self.memory_format = torch.channels_last
+
+        if profile.freeze:
+            try:
+                frozen = torch.jit.freeze(self.model)
+                self.model = torch.jit.optimize_for_inference(frozen)
+            except Exception as e:
+                print(f"lama model freeze failed, fall back to eager graph: {e}")
+
+    def warmup(
+        self,
+        shapes: Tuple[Tuple[int, int], ...],
+        pad_out_to_modulo: int = 8,
+        batch_size: int = 1,
+    ) -> None:
+        """
+        在预期尺寸和批大小上预先推理，避免前几帧承担 JIT 特化开销
+
+        Args:
+            shapes: 模型输入的 (高, 宽)，补齐前
+            pad_out_to_modulo: 与实际推理时 batch 的参数一致
+            batch_size: 每次前向推理的数量
+        """
+        if self.profile is None or not self.profile.warmup_iterations:
+            return
+        for height, width in shapes:
+            images = [np.zeros((height, width, 3), np.uint8)] * batch_size
+            masks = [np.zeros((height, width), np.uint8)] * batch_size
+            for _ in range(self.profile.warmup_iterations):
+                self.batch(images, masks, pad_out_to_modulo, max_batch=batch_size)
+
+    def forward(self, image, mask):
+        if self.profile is not None and self.profile.bf16:
+            with torch.autocast("cpu", dtype=torch.bfloat16):
+                return self.model(image, mask).float()
+        return self.model(image, mask)
 
-        with torch.inference_mode():
-            inpainted = self.model(image, mask)
+    def __call__(self, image, mask):
+        with self._lock, torch.inference_mode():
+            image, mask = self.input_buffers.prepare([image], [mask])
+            inpainted = self.forward(image, mask)
 
             cur_res = inpainted[0].permute(1, 2, 0).detach().cpu().numpy()
             cur_res = np.clip(cur_res * 255, 0, 255).astype(np.uint8)
             return cur_res
+
+    def batch(self, images, masks, pad_out_to_modulo=8, max_batch=8):
+        """
+        批量修复，按补齐后的尺寸分桶，每个桶一次前向推理
+
+        Args:
+            images: 输入图像列表
+            masks: 与 images 对应的掩码列表
+            pad_out_to_modulo: 补齐到该值的倍数，取大一些可让相近尺寸落入同一个桶
+            max_batch: 单次前向推理的最大数量
+
+        Returns:
+            按输入顺序排列的修复图像，尺寸与输入相同
+        """
+        buckets = {}
+        for i, image in enumerate(images):
+            h, w = image.shape[:2]
+            key = (ceil_modulo(h, pad_out_to_modulo), ceil_modulo(w, pad_out_to_modulo))
+            buckets.setdefault(key, []).append(i)
+
+        results = [None] * len(images)
+        for indices in buckets.values():
+            for start in range(0, len(indices), max_batch):
+                chunk = indices[start : start + max_batch]
+                with self._lock, torch.inference_mode():
+                    image_t, mask_t = self.input_buffers.prepare(
+                        [images[i] for i in chunk],
+                        [masks[i] for i in chunk],
+                        pad_out_to_modulo,
+                    )
+                    inpainted = self.forward(image_t, mask_t)
+                    cur_res = inpainted.permute(0, 2, 3, 1).detach().cpu().numpy()
+                cur_res = np.clip(cur_res * 255, 0, 255).astype(np.uint8)
+
+                for i, res in zip(chunk, cur_res):
+                    h, w = images[i].shape[:2]
+                    results[i] = res[:h, :w]
+        return results
+
+    def inpaint_tiled(self, image, mask, tile_size=512, overlap=64, max_batch=1):
+        """
+        分块推理：用互相重叠的 tile_size 方块覆盖图像，只推理含有掩码像素的块，
+        重叠部分线性羽化拼接。峰值内存只与 tile_size 和 max_batch 有关，
+        与区域尺寸无关，适合 4K 等宽字幕带
+
+        Args:
+            image: 输入图像
+            mask: 文字掩码，非零处需要修复
+            tile_size: 分块边长，取 8 的倍数可避免补齐
+            overlap: 相邻分块的重叠像素数，也是羽化宽度
+            max_batch: 单次前向推理的分块数
+
+        Returns:
+            与 image 同尺寸的修复图像
+        """
+        tiles, self.last_tile_stats = plan_overlapping_tiles(mask, tile_size, overlap)
+        result = image.copy()
+        if not tiles:
+            return result
+
+        height, width = image.shape[:2]
+        accum = np.zeros((height, width, 3), np.float32)
+        weight = np.zeros((height, width), np.float32)
+        for start in range(0, len(tiles), max_batch):
+            chunk = tiles[start : start + max_batch]
+            inpainted = self.batch(
+                [image[y1:y2, x1:x2] for y1, y2, x1, x2 in chunk],
+                [mask[y1:y2, x1:x2] for y1, y2, x1, x2 in chunk],
+                max_batch=max_batch,
+            )
+            for (y1, y2, x1, x2), cur_res in zip(chunk, inpainted):
+                w = tile_weight((y1, y2, x1, x2), height, width, overlap)
+                accum[y1:y2, x1:x2] += cur_res * w[..., np.newaxis]
+                weight[y1:y2, x1:x2] += w
+
+        # 未被推理分块覆盖的像素保持原样
+        covered = weight > 0
+        merged = image.copy()
+        merged[covered] = np.clip(
+            accum[covered] / weight[covered, np.newaxis] + 0.5, 0, 255
+        ).astype(np.uint8)
+        blend_window(result, mask, (0, height, 0, width), merged)
+        return result
+
+    def inpaint_crop(self, image, mask, margin=64, max_size=None):
+        """
+        只在掩码外接矩形加 margin 的窗口内运行模型，结果按掩码羽化贴回原图
+
+        Args:
+            image: 输入图像
+            mask: 文字掩码，非零处需要修复
+            margin: 外接矩形向四周扩展的上下文像素数
+            max_size: 窗口长边超过该值时先缩小再推理，None 不限制
+
+        Returns:
+            与 image 同尺寸的修复图像
+        """
+        return self.inpaint_crop_batch([image], [mask], margin, max_size)[0]
+
+    def inpaint_crop_batch(
+        self, images, masks, margin=64, max_size=None, pad_out_to_modulo=8
+    ):
+        """inpaint_crop 的批量版本，所有窗口通过 batch 分桶推理"""
+        results = [image.copy() for image in images]
+        windows = [
+            crop_window(image, mask, margin, max_size)
+            for image, mask in zip(images, masks)
+        ]
+        todo = [i for i, window in enumerate(windows) if window is not None]
+        inpainted = self.batch(
+            [windows[i][1] for i in todo],
+            [windows[i][2] for i in todo],
+            pad_out_to_modulo,
+        )
+        for i, cur_res in zip(todo, inpainted):
+            box = windows[i][0]
+            blend_window(results[i], masks[i], box, cur_res)
+        return results
+
+
+def plan_overlapping_tiles(mask, tile_size=512, overlap=64):
+    """
+    用步长 tile_size - overlap 的方块覆盖掩码，最后一行/列贴齐边缘，
+    只保留含有掩码像素的块
+
+    Returns:
+        (分块 [(y1, y2, x1, x2)], TileStats)
+    """
+    if overlap >= tile_size:
+        raise ValueError("overlap must be smaller than tile_size")
+
+    height, width = mask.shape[:2]
+    stride = tile_size - overlap
+
+    def starts(size):
+        if size <= tile_size:
+            return [0]
+        return list(range(0, size - tile_size, stride)) + [size - tile_size]
+
+    integral = cv2.integral((mask > 0).astype(np.uint8))
+    coords = []
+    for y1 in starts(height):
+        for x1 in starts(width):
+            coords.append(
+                (y1, min(y1 + tile_size, height), x1, min(x1 + tile_size, width))
+            )
+    tiles = [
+        (y1, y2, x1, x2)
+        for y1, y2, x1, x2 in coords
+        if integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+    ]
+    return tiles, TileStats(len(coords), len(tiles), len(coords) - len(tiles))
+
+
+def tile_weight(box, height, width, overlap):
+    """分块的羽化权重，与相邻分块重叠的一侧从 0 线性升到 1，图像边缘一侧为 1"""
+    y1, y2, x1, x2 = box
+
+    def ramp(start, end, size):
+        w = np.ones(end - start, np.float32)
+        n = min(overlap, end - start)
+        edge = (np.arange(n, dtype=np.float32) + 0.5) / overlap
+        if start > 0:
+            w[:n] = np.minimum(w[:n], edge)
+        if end < size:
+            w[-n:] = np.minimum(w[-n:], edge[::-1])
+        return w
+
+    return np.outer(ramp(y1, y2, height), ramp(x1, x2, width))
+
+
+def crop_window(image, mask, margin, max_size=None):
+    """
+    求掩码外接矩形加 margin 的窗口，窗口长边超过 max_size 时缩小
+
+    Returns:
+        ((y1, y2, x1, x2), 窗口图像, 窗口掩码)，掩码为空时返回 None
+    """
+    x, y, w, h = cv2.boundingRect((mask > 0).astype(np.uint8))
+    if w == 0 or h == 0:
+        return None
+
+    height, width = image.shape[:2]
+    y1, y2 = max(y - margin, 0), min(y + h + margin, height)
+    x1, x2 = max(x - margin, 0), min(x + w + margin, width)
+    window = image[y1:y2, x1:x2]
+    window_mask = mask[y1:y2, x1:x2]
+
+    # 窗口过大时缩小后推理
+    window_h, window_w = y2 - y1, x2 - x1
+    if max_size and max(window_h, window_w) > max_size:
+        factor = max_size / max(window_h, window_w)
+        dsize = (max(int(window_w * factor), 1), max(int(window_h * factor), 1))
+        window = cv2.resize(window, dsize, interpolation=cv2.INTER_AREA)
+        window_mask = cv2.resize(window_mask, dsize, interpolation=cv2.INTER_NEAREST)
+    return (y1, y2, x1, x2), window, window_mask
+
+
+def blend_window(result, mask, box, cur_res):
+    """将窗口修复结果还原到窗口尺寸，按羽化掩码贴回 result"""
+    y1, y2, x1, x2 = box
+    window = result[y1:y2, x1:x2]
+    if cur_res.shape[:2] != window.shape[:2]:
+        cur_res = cv2.resize(
+            cur_res, (x2 - x1, y2 - y1), interpolation=cv2.INTER_CUBIC
+        )
+
+    # 羽化掩码，避免贴回后出现硬边
+    alpha = cv2.dilate(mask[y1:y2, x1:x2], np.ones((5, 5), np.uint8))
+    alpha = cv2.GaussianBlur(alpha, (5, 5), 0).astype(np.float32) / 255
+    alpha = alpha[..., np.newaxis]
+    result[y1:y2, x1:x2] = (alpha * cur_res + (1 - alpha) * window).astype(np.uint8)
@@ -0,0 +1,111 @@
+import gc
+import importlib.util
+import threading
+import time
+
+
+class LamaManager:
+    """
+    LaMa 模型管理：首次使用时加载，所有 Inpainter 共享同一个实例
+
+    支持后台预加载和手动卸载，启动程序时不再加载模型。
+    fp32 与 int8 量化模型 (INPAINT_LAMA_INT8) 分别缓存，互不影响
+    """
+
+    def __init__(self, model_path="big-lama.pt", profile="default"):
+        self.model_path = model_path
+        self.profile = profile  # inpaint.lama.PROFILES 中的名称
+        self.load_time = None  # 上次加载耗时 (秒)
+
+        self._models = {}  # {quantized: SimpleLama}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def available():
+        """是否安装了 torch"""
+        return importlib.util.find_spec("torch") is not None
+
+    def is_loaded(self, quantized=False):
+        return quantized in self._models
+
+    def set_profile(self, profile):
+        """切换推理配置，已加载的模型会被卸载，下次使用时按新配置加载"""
+        if profile == self.profile:
+            return
+        self.unload()
+        self.profile = profile
+
+    def get(self, quantized=False):
+        """
+        返回模型实例，未加载时阻塞加载（后台加载中则等待其完成）
+
+        Args:
+            quantized: 为 True 时返回 int8 量化模型
+        """
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+        with self._lock:
+            if quantized not in self._models:
+                self._load(quantized)
+            return self._models[quantized]
+
+    def load_async(self, quantized=False):
+        """在后台线程中加载模型，已加载或正在加载时直接返回"""
+        with self._lock:
+            if quantized in self._models or self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._load_in_background,
+                args=(quantized,),
+                name="LamaLoader",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def unload(self):
+        """释放模型占用的内存"""
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+        with self._lock:
+            if not self._models:
+                return
+            self._models.clear()
+            gc.collect()
+
+            import torch
+
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+            print("lama model unloaded")
+
+    def _load_in_background(self, quantized):
+        try:
+            with self._lock:
+                if quantized not in self._models:
+                    self._load(quantized)
+        except Exception as e:
+            print(f"lama model load failed: {e}")
+        finally:
+            self._thread = None
+
+    def _load(self, quantized=False):
+        if not self.available():
+            raise ImportError("torch is not installed, INPAINT_LAMA is unavailable")
+
+        import inpaint.lama as lama
+
+        s = time.time()
+        profile = lama.PROFILES.get(self.profile)
+        model = lama.SimpleLama(self.model_path, profile, quantized)
+        self._models[quantized] = model
+        self.load_time = time.time() - s
+        variant = "int8" if quantized else self.profile
+        print(f"lama model loaded on {model.device} ({variant}): {self.load_time:.2f}s")
+
+
+lama_manager = LamaManager()
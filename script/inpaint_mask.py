@@ -1,4 +1,4 @@
-from typing import Tuple
+from typing import List, Tuple
 
 import cv2
 import numpy as np
@@ -140,20 +140,73 @@ def move_mask(
 def shift_expand_mask(
     mask: np.ndarray, up: int = 0, down: int = 0, right: int = 0, left: int = 0
 ) -> np.ndarray:
+    """将掩码中每个非零像素向上下左右扩展指定像素数
+
+    等价于逐像素写入 [row - up, row + down] x [col - left, col + right] 矩形，
+    这里用非对称矩形核的膨胀一次完成
+
+    Args:
+        mask: 单通道掩码
+        up, down, right, left: 各方向扩展的像素数
+
+    Returns:
+        扩展后的掩码，非零处为 255
+    """
     if up + down + right + left == 0:
         return mask
 
     height, width = mask.shape[:2]
-    expanded_mask = np.zeros_like(mask)
-    mask_indices = np.argwhere(mask > 0)
-    for row, col in mask_indices:
-        start_row = max(row - up, 0)
-        end_row = min(row + down + 1, height)
-        start_col = max(col - left, 0)
-        end_col = min(col + right + 1, width)
-        expanded_mask[start_row:end_row, start_col:end_col] = 255
-
-    return expanded_mask
+    # 超出图像尺寸的扩展没有意义，截断以控制核大小
+    up, down = min(up, height - 1), min(down, height - 1)
+    left, right = min(left, width - 1), min(right, width - 1)
+
+    binary = np.zeros_like(mask)
+    binary[mask > 0] = 255
+
+    # dst(r, c) = max src(r + dr, c + dc), dr ∈ [-down, up], dc ∈ [-right, left]
+    kernel = np.ones((up + down + 1, left + right + 1), np.uint8)
+    return cv2.dilate(binary, kernel, anchor=(right, down), iterations=1)
+
+
+def mask_components(
+    mask: np.ndarray, padding: int = 16
+) -> List[Tuple[int, int, int, int]]:
+    """求掩码连通域的外接矩形，向外扩展 padding 后合并相交的矩形
+
+    合并后的矩形互不相交，可以分别修复后直接贴回
+
+    Args:
+        mask: 单通道掩码
+        padding: 每个矩形向四周扩展的上下文像素数，间距小于 2 * padding 的连通域会被合并
+
+    Returns:
+        [(y1, y2, x1, x2)]
+    """
+    height, width = mask.shape[:2]
+    binary = (mask > 0).astype(np.uint8)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    boxes = [
+        (
+            max(y - padding, 0),
+            min(y + h + padding, height),
+            max(x - padding, 0),
+            min(x + w + padding, width),
+        )
+        for x, y, w, h, _ in stats[1:].tolist()
+    ]
+
+    # 画出所有矩形再求连通域，直到矩形数量不再减少，此时矩形两两不相交
+    canvas = np.zeros_like(binary)
+    while len(boxes) > 1:
+        canvas[:] = 0
+        for y1, y2, x1, x2 in boxes:
+            canvas[y1:y2, x1:x2] = 1
+        count, _, stats, _ = cv2.connectedComponentsWithStats(canvas, connectivity=8)
+        if count - 1 == len(boxes):
+            break
+        boxes = [(y, y + h, x, x + w) for x, y, w, h, _ in stats[1:].tolist()]
+
+    return boxes
 
 
 def add_text_to_image(image: np.ndarray, width: int, colors) -> None:
@@ -1,23 +1,32 @@
 import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
 import cv2
 import inpaint.fsr_parallel as fsr_parallel
+import inpaint.fsr_process as fsr_process
 import inpaint_mask as maskutil
 import numpy as np
-
-try:
-    import importlib.metadata
-
-    torch_version = importlib.metadata.version("torch")
-    print(f"torch 已安装，版本: {torch_version}")
-    import inpaint.lama as lama
-
-    simplelama = lama.SimpleLama()
-except ImportError as e:
-    simplelama = None
+from inpaint.lama_manager import lama_manager
 
 
 class Inpainter:
+    # 按掩码连通域裁剪后分别修复，结果与整块修复逐像素一致的算法，默认裁剪
+    EXACT_COMPONENT_METHODS = ("INPAINT_NS", "INPAINT_TELEA")
+    # 支持按掩码连通域裁剪的全部算法。FSR 依赖整块上下文，裁剪后结果与整块修复
+    # 存在差异 (合成字幕上个别像素相差约 10)，需显式设置 component_crop=True
+    COMPONENT_METHODS = EXACT_COMPONENT_METHODS + (
+        "INPAINT_FSR_FAST",
+        "INPAINT_FSR_BEST",
+        "INPAINT_FSR_PARA",
+        "INPAINT_FSR_BEST_PARA",
+    )
+    # 使用 LaMa 模型的算法，INPAINT_LAMA_INT8 为 CPU int8 量化模型
+    LAMA_METHODS = ("INPAINT_LAMA", "INPAINT_LAMA_INT8")
+    # LaMa 批量推理时补齐到该值的倍数，让尺寸相近的窗口落入同一个桶
+    LAMA_BUCKET_MODULO = 32
+    LAMA_MAX_BATCH = 8  # 与 LaMa.batch 的 max_batch 默认值一致
+
     def __init__(
         self,
         method="INPAINT_NS",
@@ -25,10 +34,15 @@ class Inpainter:
         x_offset: int = -2,
         y_offset: int = -2,
         autosub: int = 2000,
+        component_crop: Optional[bool] = None,
+        component_padding: int = 16,
+        component_workers: int = 1,
+        lama_crop: bool = True,
+        lama_margin: int = 64,
+        lama_max_size: Optional[int] = None,
+        lama_tile_size: Optional[int] = None,
+        lama_tile_overlap: int = 64,
     ) -> None:
-        if simplelama:
-            self.lama = simplelama
-
         self.method = method
         self.stroke = stroke
         self.dilate_kernal_size = self.stroke * 2 + 1
@@ -37,6 +51,80 @@ class Inpainter:
         self.y_offset = y_offset  # 向下偏移的像素数
         # 打轴
         self.autosub = autosub
+        # 按连通域裁剪修复，None 时只用于 EXACT_COMPONENT_METHODS
+        self.component_crop = component_crop
+        self.component_padding = component_padding
+        self.component_workers = component_workers
+        # LaMa 只在掩码外接矩形 + lama_margin 的窗口内推理，窗口长边可限制为 lama_max_size
+        self.lama_crop = lama_crop
+        self.lama_margin = lama_margin
+        self.lama_max_size = lama_max_size
+        # 区域长边超过 lama_tile_size 时分块推理，限制峰值内存，None 不分块
+        self.lama_tile_size = lama_tile_size
+        self.lama_tile_overlap = lama_tile_overlap
+        # INPAINT_FSR_PARA / INPAINT_FSR_BEST_PARA 的常驻线程池和进程池，首次使用时创建
+        self.tile_executor = None
+        self.process_executor = None
+        self.component_executor = None
+
+    def __getstate__(self):
+        """传给子进程时不携带线程池和进程池"""
+        state = self.__dict__.copy()
+        state.update(
+            tile_executor=None, process_executor=None, component_executor=None
+        )
+        return state
+
+    @property
+    def lama(self):
+        """共享的 LaMa 模型，首次使用时加载"""
+        return lama_manager.get(quantized=self.method == "INPAINT_LAMA_INT8")
+
+    def warmup_lama(self, region_shapes, batch_size: int = 1):
+        """
+        按实际推理时的输入尺寸和批大小预热 LaMa
+
+        lama_crop 时窗口尺寸由每帧的掩码决定，无法预知，这部分选区不预热；
+        分块推理预热分块尺寸；整块推理预热选区尺寸（含防绿边的扩展）
+
+        Args:
+            region_shapes: 选区的 (高, 宽)
+            batch_size: inpaint_text_batch 每次最多传入的选区数
+        """
+        single, batched = set(), set()
+        for h, w in region_shapes:
+            if h <= 0 or w <= 0:
+                continue
+            h, w = h + 20, w + 20
+            tile = self.lama_tile_size
+            if tile and max(h, w) > tile:
+                single.add((min(h, tile), min(w, tile)))
+            elif self.lama_crop:
+                continue
+            elif tile or batch_size <= 1:
+                single.add((h, w))
+            else:
+                batched.add((h, w))
+        if single:
+            self.lama.warmup(tuple(single))
+        if batched:
+            self.lama.warmup(
+                tuple(batched),
+                self.LAMA_BUCKET_MODULO,
+                min(batch_size, self.LAMA_MAX_BATCH),
+            )
+
+    def close(self):
+        """释放常驻线程池和进程池"""
+        if self.tile_executor is not None:
+            self.tile_executor.shutdown(wait=False)
+            self.tile_executor = None
+        if self.process_executor is not None:
+            self.process_executor.shutdown()
+            self.process_executor = None
+        if self.component_executor is not None:
+            self.component_executor.shutdown(wait=False)
+            self.component_executor = None
 
     def create_mask(self, img, binary):
         return maskutil.create_mask(
@@ -57,11 +145,9 @@ class Inpainter:
         Returns:
             已修复图像
         """
-        src = img.copy()
-
-        # 扩展边缘防止绿边
-        h, w = src.shape[:2]
-        src = cv2.copyMakeBorder(src, 10, 10, 10, 10, cv2.BORDER_REFLECT)
+        # 扩展边缘防止绿边，copyMakeBorder 输出新数组，img 本身不会被修改
+        h, w = img.shape[:2]
+        src = cv2.copyMakeBorder(img, 10, 10, 10, 10, cv2.BORDER_REFLECT)
 
         mask = self.create_mask(src, binary)
 
@@ -82,7 +168,93 @@ class Inpainter:
                 )
             inpaintImg = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
 
-        elif self.method == "INPAINT_NS":
+        elif self.use_component_crop():
+            inpaintImg = self.inpaint_components(src, mask)
+
+        else:
+            inpaintImg = self.solve(src, mask)
+
+        e = time.time()
+        print("inpaint time:", e - s)  # inpaint time
+        return inpaintImg[10 : h + 10, 10 : w + 10], mask[10 : h + 10, 10 : w + 10]
+
+    def inpaint_text_batch(self, items):
+        """批量识别文字区域并修复，LAMA_METHODS 合并为按尺寸分桶的批量推理
+
+        Args:
+            items: [(输入图像, binary)]
+
+        Returns:
+            [(已修复图像, 掩码)]，与 items 顺序一致
+        """
+        # 分块推理逐个区域执行，保持峰值内存与区域数量无关
+        if (
+            self.method not in self.LAMA_METHODS
+            or self.lama_tile_size
+            or len(items) <= 1
+        ):
+            return [self.inpaint_text(img, binary) for img, binary in items]
+
+        # 扩展边缘防止绿边
+        srcs, masks = [], []
+        for img, binary in items:
+            src = cv2.copyMakeBorder(img, 10, 10, 10, 10, cv2.BORDER_REFLECT)
+            srcs.append(src)
+            masks.append(self.create_mask(src, binary))
+
+        s = time.time()
+
+        if self.lama_crop:
+            inpainted = self.lama.inpaint_crop_batch(
+                srcs,
+                masks,
+                self.lama_margin,
+                self.lama_max_size,
+                self.LAMA_BUCKET_MODULO,
+            )
+        else:
+            inpainted = self.lama.batch(srcs, masks, self.LAMA_BUCKET_MODULO)
+
+        e = time.time()
+        print("inpaint time:", e - s)  # inpaint time
+        return [
+            (inpaintImg[10:-10, 10:-10], mask[10:-10, 10:-10])
+            for inpaintImg, mask in zip(inpainted, masks)
+        ]
+
+    def use_component_crop(self) -> bool:
+        if self.component_crop is None:
+            return self.method in self.EXACT_COMPONENT_METHODS
+        return self.component_crop and self.method in self.COMPONENT_METHODS
+
+    def inpaint_components(self, src, mask):
+        """按掩码连通域裁剪，分别修复后贴回，耗时与文字面积而非区域大小相关"""
+        boxes = maskutil.mask_components(mask, self.component_padding)
+        area = sum((y2 - y1) * (x2 - x1) for y1, y2, x1, x2 in boxes)
+        if area > 0.7 * mask.size:  # 文字占满区域时裁剪没有收益
+            return self.solve(src, mask)
+
+        result = src.copy()
+
+        def solve_box(box):
+            y1, y2, x1, x2 = box
+            result[y1:y2, x1:x2] = self.solve(src[y1:y2, x1:x2], mask[y1:y2, x1:x2])
+
+        # *_PARA 算法自身已并行，逐块执行
+        if self.component_workers > 1 and not self.method.endswith("_PARA"):
+            if self.component_executor is None:
+                self.component_executor = ThreadPoolExecutor(
+                    max_workers=self.component_workers
+                )
+            list(self.component_executor.map(solve_box, boxes))
+        else:
+            for box in boxes:
+                solve_box(box)
+        return result
+
+    def solve(self, src, mask):
+        """用 self.method 对应的算法修复 src 中 mask 非零的像素"""
+        if self.method == "INPAINT_NS":
             inpaintImg = cv2.inpaint(src, mask, 3, cv2.INPAINT_NS)
 
         elif self.method == "INPAINT_TELEA":
@@ -101,11 +273,25 @@ class Inpainter:
             cv2.xphoto.inpaint(distort, mask1, inpaintImg, cv2.xphoto.INPAINT_FSR_BEST)
 
         elif self.method == "INPAINT_FSR_PARA":
-            inpaintImg = fsr_parallel.fsr(src, mask)
+            if self.tile_executor is None:
+                self.tile_executor = fsr_parallel.TileExecutor()
+            inpaintImg = self.tile_executor.fsr(src, mask)
 
-        elif self.method == "INPAINT_LAMA":
-            inpaintImg = self.lama(src, mask)
+        elif self.method == "INPAINT_FSR_BEST_PARA":
+            if self.process_executor is None:
+                self.process_executor = fsr_process.ProcessTileExecutor()
+            inpaintImg = self.process_executor.fsr_best(src, mask)
 
-        e = time.time()
-        print("inpaint time:", e - s)  # inpaint time
-        return inpaintImg[10 : h + 10, 10 : w + 10], mask[10 : h + 10, 10 : w + 10]
+        elif self.method in self.LAMA_METHODS:
+            if self.lama_tile_size and max(src.shape[:2]) > self.lama_tile_size:
+                inpaintImg = self.lama.inpaint_tiled(
+                    src, mask, self.lama_tile_size, self.lama_tile_overlap
+                )
+            elif self.lama_crop:
+                inpaintImg = self.lama.inpaint_crop(
+                    src, mask, self.lama_margin, self.lama_max_size
+                )
+            else:
+                inpaintImg = self.lama(src, mask)
+
+        return inpaintImg
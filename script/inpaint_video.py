@@ -1,44 +1,85 @@
+import os
 import queue
+import shutil
 import subprocess
 import threading
-import time
 from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Callable, List, Tuple
+from typing import Callable, List, Optional, Tuple, Union
 
 import cv2
+import ffmpeg_tools
 import inpaint_mask as maskutils
 import numpy as np
+import process_pipeline
 from inpaint_text import Inpainter
+from pipeline_queue import BlockingQueue, CancelEvent, Cancelled
+from preview import PreviewChannel
+from timeline import Timeline
 
 
 class VideoInpainter:
     QUEUE_SIZE = 15
+    LAMA_BATCH_SIZE = 4  # INPAINT_LAMA 每次批量推理最多凑齐的选区数
+    REORDER_WINDOW = 30  # 重排缓冲最多领先写入位置的帧数
     AUTOSUB_INTERVAL_FRAME = 10
+    PREVIEW_INTERVAL = 10  # 每隔多少帧发送一次预览
 
     def __init__(
         self,
         path: str,
         regions: List[Tuple[int, int, int, int]],
-        time_table: List[List[str]],
+        time_table: Union[Timeline, List[List[str]]],
         inpainter: Inpainter,
         progress_callback: Callable[[float], None],
         input_frame_callback: Callable[[np.ndarray], None],
         output_frame_callback: Callable[[np.ndarray], None],
         update_table_callback: Callable[[int, int, str], None],
-        stop_check: Callable[[], bool],
+        stop_check: Optional[Callable[[], bool]] = None,
+        num_workers: Optional[int] = None,
+        use_processes: bool = False,
+        segment_render: bool = False,
+        encoder: Optional[ffmpeg_tools.EncoderConfig] = None,
+        decoder: str = "opencv",
+        preview: Optional[PreviewChannel] = None,
     ):
+        """
+        Args:
+            time_table: 每个选区需要修复的帧，Timeline 或旧的逐帧列表
+                time_table[region_id][frame_idx]（真值为需要修复）
+            stop_check: 兼容旧接口的取消查询，由一个监视线程定期调用；
+                新代码应直接调用 cancel()
+            num_workers: 处理线程数，默认 min(4, CPU 核数)。
+                有跨帧状态的算法只使用一个，见 worker_count
+            use_processes: 用 num_workers 个进程代替处理线程，避开 GIL，
+                仅对 process_mode_supported 的算法生效
+            segment_render: 只解码并重新编码含有字幕的关键帧区间，
+                其余片段直接复制码流，见 run_segments
+            encoder: 不为 None 时通过管道交给 ffmpeg 按该配置编码，并在同一进程中
+                合并音频；None 时使用 cv2.VideoWriter (mp4v)，再由 combine_audio 合并
+            decoder: "opencv" 使用 cv2.VideoCapture，"ffmpeg" 使用多线程解码的
+                ffmpeg_tools.PipeReader
+            preview: 预览通道，用于限速和缩放预览帧，帧仍通过 input_frame_callback /
+                output_frame_callback 发送；None 时每 PREVIEW_INTERVAL 帧发送原尺寸副本
+        """
         self.inpainter = inpainter
         self.regions = regions
+        if not isinstance(time_table, Timeline):
+            time_table = Timeline.from_frames(time_table)
         self.time_table = time_table
+        # 最近一次查询的 (start, end, 选区编号)，[start, end) 内需要修复的选区不变
+        self._active_span = (0, 0, [])
 
         self.path = Path(path)
         self.cap: cv2.VideoCapture | None = None  # input_video
         self.out: cv2.VideoWriter | None = None  # output_video
         self.total_frame_count = 0
 
-        self.read_queue: queue.Queue = queue.Queue(maxsize=self.QUEUE_SIZE)
-        self.process_queue: queue.Queue = queue.Queue(maxsize=self.QUEUE_SIZE)
+        # 各阶段在阻塞队列和条件变量上等待，取消时由 cancel_event 统一唤醒
+        self.cancel_event = CancelEvent()
+        self.read_queue = BlockingQueue(self.QUEUE_SIZE, self.cancel_event)
+        self.process_queue = BlockingQueue(self.QUEUE_SIZE, self.cancel_event)
 
         self.progress_callback = progress_callback
         self.input_frame_callback = input_frame_callback
@@ -46,7 +87,23 @@ class VideoInpainter:
         self.update_table_callback = update_table_callback
         self.stop_check = stop_check
 
-        self._is_cancel = False
+        self.num_workers = num_workers or min(4, os.cpu_count() or 1)
+        self.use_processes = use_processes
+        self.segment_render = segment_render
+        self.encoder = encoder
+        self.decoder = decoder
+        self.preview = preview
+        self.workers = 1
+        # 读取线程读取的帧范围 [start, end)，end 为 None 时读到视频结束
+        self.read_range = (0, None)
+        # 写入线程按 frame_idx 顺序写出，处理线程最多领先 REORDER_WINDOW 帧
+        self.next_write_idx = 0
+        self.reorder_cond = threading.Condition()
+        self.cancel_event.register(self.reorder_cond)
+        # 没有任何选区需要修复的帧跳过处理，由 plan_passthrough 预先求出
+        self.frame_active = np.ones(0, bool)
+        self.passthrough_run_ends = set()
+
         self.cache = [None for _ in self.regions]
         self.last_frame = [deque([None] * 5, maxlen=5) for _ in self.regions]
 
@@ -62,12 +119,22 @@ class VideoInpainter:
         if self.inpainter.method == "AUTOSUB" and len(self.regions) != 1:
             print(f"Autosub only accepts ONE region!")
             return {"status": "Error", "message": "自动打轴只接受单个选区!"}
+        # 每次运行使用新的取消事件，上一次取消或失败不影响之后的运行
+        self.cancel_event = CancelEvent()
+        self.cancel_event.register(self.reorder_cond)
+        # 流水线退出时是否已取消，之后的取消 (如完成时关闭进度窗口) 不影响结果
+        cancelled = False
+        stop_watcher = self.watch_stop_check()
         try:
-            self._is_cancel = False
-            self.read_queue: queue.Queue = queue.Queue(maxsize=self.QUEUE_SIZE)
-            self.process_queue: queue.Queue = queue.Queue(maxsize=self.QUEUE_SIZE)
+            audio_muxed = False  # 音频已在编码或拼接时合并，无需 combine_audio
+            self.read_queue = BlockingQueue(self.QUEUE_SIZE, self.cancel_event)
+            self.process_queue = BlockingQueue(self.QUEUE_SIZE, self.cancel_event)
             self.cache = [None for _ in self.regions]
             self.last_frame = [deque([None] * 5, maxlen=5) for _ in self.regions]
+            self.workers = self.worker_count()
+            self.read_range = (0, None)
+            self.next_write_idx = 0
+            self._active_span = (0, 0, [])
             self.AUTO_last_sentence_id = 0
             self.AUTO_last_sentence_time = int(self.AUTOSUB_INTERVAL_FRAME)
             self.AUTO_subtitle_active = False
@@ -75,7 +142,7 @@ class VideoInpainter:
             self.AUTO_last_region_start = 0
             self.AUTO_last_frame_start = 0
 
-            self.cap = cv2.VideoCapture(str(self.path))
+            self.cap = self.open_capture()
             self.fps = self.cap.get(cv2.CAP_PROP_FPS)
             width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
             height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
@@ -83,23 +150,49 @@ class VideoInpainter:
 
             # path/file.mp4 - > path/file_temp.mp4
             output_path = self.path.with_name(self.path.stem + "_temp.mp4")
-            self.out = cv2.VideoWriter(
-                str(output_path), fourcc, self.fps, (width, height)
-            )
+            # path/file.mp4 -> path/file_output.mp4
+            final_path = self.path.with_name(self.path.stem + "_output.mp4")
             self.total_frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
 
-            # 生产者-消费者模式实现并发
-            threads = [
-                threading.Thread(target=self.video_reader, name="ReaderThread"),
-                threading.Thread(target=self.video_processor, name="ProcessorThread"),
-                threading.Thread(target=self.video_writer, name="WriterThread"),
-            ]
-
-            for thread in threads:
-                thread.start()
-
-            for thread in threads:
-                thread.join()
+            self.plan_passthrough()
+
+            # 预热 LaMa，避免前几帧承担 JIT 特化开销
+            if self.inpainter.method in Inpainter.LAMA_METHODS:
+                shapes = []
+                for region in self.regions:
+                    x1, x2, y1, y2 = region["region"]
+                    shapes.append((y2 - y1, x2 - x1))
+                self.inpainter.warmup_lama(shapes, self.LAMA_BATCH_SIZE)
+
+            plan = None
+            if self.segment_render and self.inpainter.method != "AUTOSUB":
+                plan = ffmpeg_tools.keyframe_segments(self.path, self.frame_active)
+                if plan is None:
+                    print("Segment render unavailable, fall back to full render")
+
+            if plan is not None:
+                audio_muxed = True
+                cancelled = not self.run_segments(plan, final_path, (height, width, 3))
+            elif self.encoder is not None and self.inpainter.method != "AUTOSUB":
+                audio_muxed = True
+                self.out = ffmpeg_tools.PipeWriter(
+                    final_path,
+                    (width, height),
+                    self.fps,
+                    self.encoder.args(),
+                    audio_source=self.path,
+                )
+                self.run_pipeline((height, width, 3))
+                cancelled = self.cancel_event.is_set()
+                out, self.out = self.out, None
+                if not out.release() and not cancelled:
+                    raise RuntimeError("ffmpeg encode failed")
+            else:
+                self.out = cv2.VideoWriter(
+                    str(output_path), fourcc, self.fps, (width, height)
+                )
+                self.run_pipeline((height, width, 3))
+                cancelled = self.cancel_event.is_set()
 
             self.progress_callback(100)
 
@@ -108,110 +201,411 @@ class VideoInpainter:
             return {"status": "Warn", "message": ""}
 
         finally:
+            if stop_watcher is not None:
+                stop_watcher.set()
             # Release resources
             if self.cap:
                 self.cap.release()
             if self.out:
                 self.out.release()
 
-            if not self._is_cancel:
+            if not cancelled:
                 if self.inpainter.method == "AUTOSUB":
                     self.export_subtitle()
-                else:
+                elif not audio_muxed:
                     self.combine_audio()
-                output_path.unlink()
+                output_path.unlink(missing_ok=True)
                 return {"status": "Success", "message": ""}
             else:
-                output_path.unlink()
+                output_path.unlink(missing_ok=True)
+                if audio_muxed:  # 删除未完成的输出
+                    final_path.unlink(missing_ok=True)
                 return {"status": "Warn", "message": ""}
 
-    def video_reader(self) -> None:
-        frame_idx = 0
-        while self.cap and self.cap.isOpened() and not self.stop_check():
-            ret, frame = self.cap.read()
+    def cancel(self) -> None:
+        """取消处理：唤醒所有阻塞中的阶段并使其尽快退出，可从任意线程调用"""
+        self.cancel_event.set()
+
+    def watch_stop_check(self) -> Optional[threading.Event]:
+        """
+        传入了 stop_check 时启动监视线程，查询到停止后调用 cancel()
+
+        Returns:
+            用于结束监视线程的事件，未传入 stop_check 时为 None
+        """
+        if self.stop_check is None:
+            return None
+        finished = threading.Event()
+
+        def watch():
+            while not finished.wait(0.1):
+                if self.stop_check():
+                    self.cancel()
+                    return
+
+        threading.Thread(target=watch, name="StopCheckThread", daemon=True).start()
+        return finished
+
+    def run_stage(self, stage: Callable[..., None], *args) -> None:
+        """
+        流水线线程入口。取消时安静退出；出现未处理的异常时取消整条流水线，
+        避免其余阶段在队列上永久阻塞
+        """
+        try:
+            stage(*args)
+        except Cancelled:
+            print(f"{threading.current_thread().name} cancelled")
+        except Exception as e:
+            print(f"{threading.current_thread().name} failed: {str(e)}")
+            self.cancel()
+
+    def open_capture(self):
+        if self.decoder == "ffmpeg":
+            cap = ffmpeg_tools.PipeReader(self.path)
+            if cap.isOpened():
+                return cap
+            print("ffmpeg decoder unavailable, fall back to cv2.VideoCapture")
+        return cv2.VideoCapture(str(self.path))
+
+    def recycle_frame(self, frame: np.ndarray) -> None:
+        """把用完的解码帧缓冲归还给 PipeReader 复用，其他数组忽略"""
+        if isinstance(self.cap, ffmpeg_tools.PipeReader):
+            self.cap.recycle(frame)
+
+    def run_pipeline(self, frame_shape: Tuple[int, int, int]) -> None:
+        """处理 read_range 内的帧并写入 self.out"""
+        if self.use_processes and self.process_mode_supported():
+            self.run_process_pipeline(frame_shape)
+            return
+
+        # 生产者-消费者模式实现并发
+        threads = [
+            threading.Thread(
+                target=self.run_stage, args=(self.video_reader,), name="ReaderThread"
+            ),
+            threading.Thread(
+                target=self.run_stage, args=(self.video_writer,), name="WriterThread"
+            ),
+        ]
+        threads += [
+            threading.Thread(
+                target=self.run_stage,
+                args=(self.video_processor,),
+                name=f"ProcessorThread-{i}",
+            )
+            for i in range(self.workers)
+        ]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+    def run_segments(
+        self, plan: ffmpeg_tools.SegmentPlan, output_path, frame_shape
+    ) -> bool:
+        """
+        分段渲染：含有字幕的关键帧区间解码、修复后用与源视频相同的编码器重新编码，
+        其余区间直接复制码流，最后无损拼接为 output_path 并同时合并源视频的音频
+
+        Args:
+            plan: ffmpeg_tools.keyframe_segments 的结果
+            output_path: 输出视频路径
+            frame_shape: 帧尺寸 (高, 宽, 3)
+
+        Returns:
+            是否全部完成，重新编码片段时被取消返回 False
+        """
+        segments = plan.segments
+        segment_dir = output_path.with_name(self.path.stem + "_segments")
+        segment_dir.mkdir(exist_ok=True)
+        rendered = sum(s.end - s.start for s in segments if s.render)
+        print(f"Segment render: {rendered}/{self.total_frame_count} frames re-encoded")
+
+        try:
+            paths = ffmpeg_tools.split_segments(self.path, plan, segment_dir)
+            for segment, path in zip(segments, paths):
+                if self.cancel_event.is_set():
+                    return False
+
+                if segment.render:
+                    # 覆盖切分出的原始片段
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, segment.start)
+                    self.read_range = (segment.start, segment.end)
+                    self.next_write_idx = segment.start
+                    self.out = ffmpeg_tools.SegmentWriter(path, plan, self.fps)
+                    self.run_pipeline(frame_shape)
+                    cancelled = self.cancel_event.is_set()
+                    out, self.out = self.out, None
+                    if not out.release() and not cancelled:
+                        raise RuntimeError(f"Failed to encode segment {segment}")
+                    if cancelled:
+                        return False
+                else:
+                    self.progress_callback(segment.end / self.total_frame_count * 100)
+
+            ffmpeg_tools.concat_segments(paths, output_path, self.path)
+            return True
+        finally:
+            shutil.rmtree(segment_dir, ignore_errors=True)
+
+    def worker_count(self) -> int:
+        """
+        处理线程数。FSR 的修复缓存和 last_frame 历史、自动打轴的时轴都依赖
+        按帧序逐帧更新，这些算法固定使用一个处理线程；
+        其余算法每帧独立，使用 num_workers 个线程并由写入线程重排
+        """
+        if self.inpainter.method.startswith("INPAINT_FSR"):
+            return 1
+        if self.inpainter.method == "AUTOSUB":
+            return 1
+        return self.num_workers
+
+    def plan_passthrough(self) -> None:
+        """
+        从时间轴预先求出没有任何选区需要修复的帧，这些帧不经过处理线程、
+        不复制，直接交给写入线程。自动打轴需要逐帧分析，不使用直通
+        """
+        active = np.ones(self.total_frame_count, bool)
+        if self.inpainter.method != "AUTOSUB" and self.regions:
+            # 超出时间轴的帧按原流程处理
+            length = min(self.total_frame_count, self.time_table.frame_count)
+            active[:length] = self.time_table.active_mask()[:length]
+        self.frame_active = active
+        # 每段连续直通帧只在最后一帧更新一次表格
+        run_ends = ~active & np.append(active[1:], True)
+        self.passthrough_run_ends = set(np.flatnonzero(run_ends).tolist())
+
+    def is_passthrough(self, frame_idx: int) -> bool:
+        if frame_idx >= len(self.frame_active):
+            return False
+        if frame_idx in self.passthrough_run_ends:
+            self.update_table_callback(-1, frame_idx, "")
+        return not self.frame_active[frame_idx]
+
+    def process_mode_supported(self) -> bool:
+        """
+        进程模式只用于每帧独立、无需加载模型的算法。
+        有跨帧状态的算法需要按帧序处理，LaMa 模型不宜在每个进程中各加载一份
+        """
+        if self.worker_count() == 1:
+            return False
+        return self.inpainter.method not in Inpainter.LAMA_METHODS
+
+    def run_process_pipeline(self, frame_shape: Tuple[int, int, int]) -> None:
+        """
+        进程模式：读取线程把帧解码进共享内存帧槽，进程池原地修复，
+        写入线程按帧序取回结果。帧槽总数限制了在途帧数，起到背压作用
+        """
+        slots = self.workers * 2 + 2
+        ring = process_pipeline.FrameRing(slots, frame_shape)
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=process_pipeline.init_worker,
+            initargs=(ring.spec(), self.inpainter, self.regions),
+        )
+        free_slots = BlockingQueue(0, self.cancel_event)
+        for slot in range(slots):
+            free_slots.put(slot)
+        # 按帧序排列的在途任务，每项占用一个帧槽
+        pending = BlockingQueue(0, self.cancel_event)
+        # 任务完成时通知写入线程
+        result_cond = threading.Condition()
+        self.cancel_event.register(result_cond)
+
+        threads = [
+            threading.Thread(
+                target=self.run_stage,
+                args=(self.shared_reader, ring, pool, free_slots, pending),
+                name="ReaderThread",
+            ),
+            threading.Thread(
+                target=self.run_stage,
+                args=(self.shared_writer, ring, free_slots, pending, result_cond),
+                name="WriterThread",
+            ),
+        ]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            pool.shutdown(wait=True)
+            ring.release()
+
+    def shared_reader(self, ring, pool, free_slots, pending) -> None:
+        frame_idx, end = self.read_range
+        while self.cap and self.cap.isOpened() and frame_idx != end:
+            slot = free_slots.get()
+
+            # 直接解码进帧槽
+            ret, frame = self.cap.read(ring.frames[slot])
             if not ret:
                 break
-            frames = (frame_idx, frame)
+            if not np.shares_memory(frame, ring.frames[slot]):
+                ring.frames[slot] = frame
+
+            if self.is_passthrough(frame_idx):
+                pending.put((frame_idx, slot, None, None))
+                frame_idx += 1
+                continue
+
+            # 预览需要修复前的帧，须在提交之前复制：工作进程原地修复帧槽
+            frame_before = self.snapshot(frame) if self.preview_due(frame_idx) else None
+            active = self.active_regions(frame_idx)
+            future = pool.submit(process_pipeline.process_frame, slot, active)
+            pending.put((frame_idx, slot, future, frame_before))
+            frame_idx += 1
+
+        # 结束信号
+        pending.put(None)
+
+    def shared_writer(self, ring, free_slots, pending, result_cond) -> None:
+        def notify(_):
+            with result_cond:
+                result_cond.notify_all()
+
+        try:
             while True:
-                if self.stop_check():
-                    self._is_cancel = True
-                    print("Reader thread cancelled while queue is full!")
-                    return
-                try:
-                    self.read_queue.put(frames, timeout=0.1)
-                    frame_idx += 1
+                item = pending.get()
+                if item is None:
                     break
-                except queue.Full:
-                    time.sleep(0.01)  # 短暂睡眠以避免CPU过度使用
+                frame_idx, slot, future, frame_before = item
+                passthrough = future is None
+
+                done = None
+                if not passthrough:
+                    future.add_done_callback(notify)
+                    with result_cond:
+                        self.cancel_event.wait_for(result_cond, future.done)
+                    try:
+                        done = future.result()
+                    except Exception as e:
+                        print(f"Error processing frame {frame_idx}: {str(e)}")
+
+                if passthrough or done is not None:
+                    frame_after = ring.frames[slot]
+                    if not passthrough:
+                        for region_id in done:
+                            self.update_table_callback(region_id, frame_idx, "")
+                        if not done:
+                            self.update_table_callback(-1, frame_idx, "")
+                        if frame_before is not None:
+                            self.input_frame_callback(frame_before)
+                            self.output_frame_callback(self.snapshot(frame_after))
+                        print(frame_idx)
+
+                    self.out.write(frame_after)
+                    progress = ((frame_idx + 1) / self.total_frame_count) * 100
+                    self.progress_callback(progress)
+                free_slots.put(slot)
+        except Cancelled:
+            self.cancel_pending(pending)
+            raise
 
-        # 发送结束信号
-        while True:
-            if self.stop_check():
-                self._is_cancel = True
-                print("Reader thread cancelled while trying to send end signal")
-                return
-            try:
-                self.read_queue.put(None, timeout=0.1)
+    @staticmethod
+    def cancel_pending(pending) -> None:
+        """取消队列中尚未开始的任务，正在执行的任务由进程池关闭时等待"""
+        for item in pending.drain():
+            if item is not None and item[2] is not None:
+                item[2].cancel()
+
+    def wait_reorder_window(self, frame_idx: int) -> None:
+        """等待 frame_idx 进入重排窗口，限制重排缓冲的大小；取消时抛出 Cancelled"""
+        with self.reorder_cond:
+            self.cancel_event.wait_for(
+                self.reorder_cond,
+                lambda: frame_idx - self.next_write_idx < self.REORDER_WINDOW,
+            )
+
+    def video_reader(self) -> None:
+        frame_idx, end = self.read_range
+        while self.cap and self.cap.isOpened() and frame_idx != end:
+            # 解码不在队列上阻塞，需要主动检查取消
+            if self.cancel_event.is_set():
+                raise Cancelled
+            ret, frame = self.cap.read()
+            if not ret:
                 break
-            except queue.Full:
-                time.sleep(0.01)
+
+            # 直通帧跳过处理线程，直接进入写入线程的重排缓冲
+            if self.is_passthrough(frame_idx):
+                self.wait_reorder_window(frame_idx)
+                self.process_queue.put((frame_idx, frame))
+            else:
+                self.read_queue.put((frame_idx, frame))
+            frame_idx += 1
+
+        # 每个处理线程一个结束信号
+        for _ in range(self.workers):
+            self.read_queue.put(None)
 
     def video_processor(self) -> None:
-        while not self.stop_check():
+        finished = False
+        while not finished:
+            frames = self.read_queue.get()
+            if frames is None:
+                break
+
+            # LaMa 凑够 LAMA_BATCH_SIZE 个待修复选区，或读队列暂时为空时开始推理
+            batch = [frames]
+            if self.inpainter.method in Inpainter.LAMA_METHODS:
+                crops = self.count_active_regions(frames[0])
+                while crops < self.LAMA_BATCH_SIZE:
+                    try:
+                        frames = self.read_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if frames is None:
+                        finished = True
+                        break
+                    batch.append(frames)
+                    crops += self.count_active_regions(frames[0])
+
             try:
-                frames = self.read_queue.get(timeout=0.1)
-                if frames is None:
-                    break
-                frame_idx, frame = frames
-                try:
-                    processed_frame = self.frame_processor(frame_idx, frame)
-                    while True:
-                        if self.stop_check():
-                            self._is_cancel = True
-                            print("Processor thread cancelled while queue is full!")
-                            return
-                        try:
-                            self.process_queue.put(
-                                (frame_idx, processed_frame), timeout=0.1
-                            )
-                            break
-                        except queue.Full:
-                            time.sleep(0.01)
-                except Exception as e:
-                    print(f"Error processing frame {frame_idx}: {str(e)}")
-                finally:
-                    self.read_queue.task_done()
-            except queue.Empty:
-                continue
+                # 原地修复，输出即输入帧缓冲，由写入线程写出后归还
+                processed_frames = self.frame_processor_batch(batch)
+            except Exception as e:
+                print(f"Error processing frame {batch[0][0]}: {str(e)}")
+                # 仍需通知写入线程，否则重排缓冲会一直等待这些帧
+                processed_frames = [None] * len(batch)
+                for _, frame in batch:
+                    self.recycle_frame(frame)
+
+            for (frame_idx, _), processed_frame in zip(batch, processed_frames):
+                self.wait_reorder_window(frame_idx)
+                self.process_queue.put((frame_idx, processed_frame))
 
         # 发送结束信号
-        while True:
-            if self.stop_check():
-                self._is_cancel = True
-                print("Processor thread cancelled while trying to send end signal")
-                return
-            try:
-                self.process_queue.put(None, timeout=0.1)
-                break
-            except queue.Full:
-                time.sleep(0.01)
+        self.process_queue.put(None)
 
     def video_writer(self) -> None:
-        written_count = 0
-        while not self.stop_check():
-            try:
-                frames = self.process_queue.get(timeout=0.1)
-                if frames is None:
+        finished_workers = 0
+        pending = {}  # 重排缓冲 {frame_idx: frame}，处理失败的帧为 None
+        while True:
+            frames = self.process_queue.get()
+            if frames is None:
+                finished_workers += 1
+                if finished_workers == self.workers:
                     break
-                _, frame = frames
-                self.out.write(frame)
-                written_count += 1
-                progress = (written_count / self.total_frame_count) * 100
-                self.progress_callback(progress)
-                self.process_queue.task_done()
-            except queue.Empty:
                 continue
 
+            frame_idx, frame = frames
+            pending[frame_idx] = frame
+            while self.next_write_idx in pending:
+                frame = pending.pop(self.next_write_idx)
+                if frame is not None:
+                    self.out.write(frame)
+                    self.recycle_frame(frame)
+                    written = self.next_write_idx + 1
+                    progress = (written / self.total_frame_count) * 100
+                    self.progress_callback(progress)
+                with self.reorder_cond:
+                    self.next_write_idx += 1
+                    self.reorder_cond.notify_all()
+
     def combine_audio(self) -> None:
         """Extract audio from the original video and combine it with the processed video"""
         # path/file.mp4 - > path/file_temp.mp4
@@ -244,79 +638,162 @@ class VideoInpainter:
         else:
             return self.frame_processor_no_cache(frame_idx, frame)
 
-    def frame_processor_no_cache(self, frame_idx: int, frame: np.ndarray) -> np.ndarray:
-        frame_before = frame.copy()
-        frame_after = frame.copy()
+    def frame_processor_batch(
+        self, batch: List[Tuple[int, np.ndarray]]
+    ) -> List[np.ndarray]:
+        if len(batch) == 1:
+            return [self.frame_processor(*batch[0])]
+        return self.frame_processor_no_cache_batch(batch)
+
+    def preview_due(self, frame_idx: int) -> bool:
+        """是否发送这一帧的预览，有预览通道时按墙钟时间限速，否则每 PREVIEW_INTERVAL 帧一次"""
+        if self.preview is not None:
+            return self.preview.claim()
+        return frame_idx % self.PREVIEW_INTERVAL == 0
+
+    def snapshot(self, frame: np.ndarray) -> np.ndarray:
+        """预览用的帧副本，帧缓冲之后会被修改或复用；有预览通道时直接缩放到显示尺寸"""
+        if self.preview is not None:
+            return self.preview.snapshot(frame)
+        return frame.copy()
+
+    def active_regions(self, frame_idx: int) -> List[int]:
+        """frame_idx 需要修复的选区编号，到下一个变化点之前的帧复用同一次查询的结果"""
+        start, end, regions = self._active_span
+        if start <= frame_idx < end:
+            return regions
+        regions = [
+            region_id
+            for region_id in self.time_table.active(frame_idx)
+            if region_id < len(self.regions)
+        ]
+        end = max(int(self.time_table.next_change(frame_idx)), frame_idx + 1)
+        # 整体替换元组，多个处理线程并发读写也不会看到不一致的状态
+        self._active_span = (frame_idx, end, regions)
+        return regions
 
-        flag = True
-        for region_id, region in enumerate(self.regions):
-            if self.time_table[region_id][frame_idx]:
-                x1, x2, y1, y2 = region["region"]
-                frame_area = frame_after[y1:y2, x1:x2]
+    def count_active_regions(self, frame_idx: int) -> int:
+        return len(self.active_regions(frame_idx))
 
-                if frame_area.size == 0:  # 空选区跳过
-                    continue
+    def frame_processor_no_cache(self, frame_idx: int, frame: np.ndarray) -> np.ndarray:
+        return self.frame_processor_no_cache_batch([(frame_idx, frame)])[0]
 
-                flag = False
-                frame_area_inpainted, _ = self.inpainter.inpaint_text(
-                    frame_area, region["binary"]
-                )
-                frame_after[y1:y2, x1:x2] = frame_area_inpainted
+    def frame_processor_no_cache_batch(
+        self, batch: List[Tuple[int, np.ndarray]]
+    ) -> List[np.ndarray]:
+        """
+        多帧的待修复选区合并为 inpaint_text_batch 调用，结果原地写回输入帧，
+        只在需要预览时复制整帧
+
+        同一帧中互相重叠的选区按行号顺序修复，后面的选区要看到前面选区的修复结果：
+        选区按 region_rounds 分轮，每轮一次批量推理，写回后再裁剪下一轮
+        """
+        frames_before = []
+        rounds = []  # rounds[k]: 第 k 轮的 [(帧, frame_idx, region_id)]
+        for frame_idx, frame in batch:
+            due = self.preview_due(frame_idx)
+            frames_before.append(self.snapshot(frame) if due else None)
+
+            region_ids = [
+                region_id
+                for region_id in self.active_regions(frame_idx)
+                if frame[self.region_slice(region_id)].size  # 空选区跳过
+            ]
+            for region_id, k in zip(region_ids, self.region_rounds(region_ids)):
+                if k == len(rounds):
+                    rounds.append([])
+                rounds[k].append((frame, frame_idx, region_id))
+
+        active_frames = set()
+        for targets in rounds:
+            items = [
+                (frame[self.region_slice(region_id)], self.regions[region_id]["binary"])
+                for frame, _, region_id in targets
+            ]
+            results = self.inpainter.inpaint_text_batch(items)
+            for (frame_after, frame_idx, region_id), (frame_area_inpainted, _) in zip(
+                targets, results
+            ):
+                frame_after[self.region_slice(region_id)] = frame_area_inpainted
                 self.update_table_callback(region_id, frame_idx, "")
+                active_frames.add(frame_idx)
 
-        if flag:
-            self.update_table_callback(-1, frame_idx, "")
-        # Callbacks handling
-        if frame_idx % 10 == 0:
-            self.input_frame_callback(frame_before)
-            self.output_frame_callback(frame_after)
-        print(frame_idx)
+        for (frame_idx, frame_after), frame_before in zip(batch, frames_before):
+            if frame_idx not in active_frames:
+                self.update_table_callback(-1, frame_idx, "")
+            # Callbacks handling
+            if frame_before is not None:
+                self.input_frame_callback(frame_before)
+                self.output_frame_callback(self.snapshot(frame_after))
+            print(frame_idx)
+
+        return [frame for _, frame in batch]
 
-        return frame_after
+    def region_slice(self, region_id: int) -> Tuple[slice, slice]:
+        x1, x2, y1, y2 = self.regions[region_id]["region"]
+        return slice(y1, y2), slice(x1, x2)
+
+    def region_rounds(self, region_ids: List[int]) -> List[int]:
+        """
+        每个选区的修复轮次：排在与它重叠的所有靠前选区之后，
+        不重叠的选区都在第 0 轮，同一轮内的选区互不重叠
+        """
+        rounds = []
+        for i, region_id in enumerate(region_ids):
+            x1, x2, y1, y2 = self.regions[region_id]["region"]
+            k = 0
+            for other_id, other_round in zip(region_ids[:i], rounds):
+                ox1, ox2, oy1, oy2 = self.regions[other_id]["region"]
+                if x1 < ox2 and ox1 < x2 and y1 < oy2 and oy1 < y2:
+                    k = max(k, other_round + 1)
+            rounds.append(k)
+        return rounds
 
     def frame_processor_with_cache(
         self, frame_idx: int, frame: np.ndarray
     ) -> np.ndarray:
-        frame_before = frame.copy()
-        frame_after = frame.copy()
+        due = self.preview_due(frame_idx)
+        frame_before = self.snapshot(frame) if due else None
 
         flag = True
-        for region_id, region in enumerate(self.regions):
-            if self.time_table[region_id][frame_idx]:
-                x1, x2, y1, y2 = region["region"]
-                frame_copy = frame_after[y1:y2, x1:x2].copy()
-
-                if frame_copy.size == 0:  # 空选区跳过
-                    continue
-
-                flag = False
-                # 检查缓存
-                frame_gray = cv2.cvtColor(frame_copy, cv2.COLOR_BGR2GRAY)
-                same_with_last = self.check_same_frame_with_last(region_id, frame_gray)
-                cache, similarity = self.check_cache_item(region_id, frame_copy)
-
-                if similarity > 0.80:
-                    frame_area_inpainted = cache
-                elif similarity > 0.65 and not same_with_last:
-                    frame_area_inpainted = cache
-                else:
-                    frame_area_inpainted, _ = self.inpainter.inpaint_text(
-                        frame_copy, region["binary"]
-                    )
-                    # 保存到缓存队列中
-                    self.cache[region_id] = {"inpainted": frame_area_inpainted.copy()}
+        for region_id in self.active_regions(frame_idx):
+            region = self.regions[region_id]
+            x1, x2, y1, y2 = region["region"]
+            # 选区视图，修复结果写回前只读
+            frame_copy = frame[y1:y2, x1:x2]
 
-                frame_after[y1:y2, x1:x2] = frame_area_inpainted
-                self.update_table_callback(region_id, frame_idx, "")
+            if frame_copy.size == 0:  # 空选区跳过
+                continue
+
+            flag = False
+            # 检查缓存
+            frame_gray = cv2.cvtColor(frame_copy, cv2.COLOR_BGR2GRAY)
+            same_with_last = self.check_same_frame_with_last(region_id, frame_gray)
+            cache, similarity = self.check_cache_item(region_id, frame_copy)
+
+            if similarity > 0.80:
+                frame_area_inpainted = cache
+            elif similarity > 0.65 and not same_with_last:
+                frame_area_inpainted = cache
+            else:
+                frame_area_inpainted, _ = self.inpainter.inpaint_text(
+                    frame_copy, region["binary"]
+                )
+                # 保存到缓存队列中
+                self.cache[region_id] = {"inpainted": frame_area_inpainted.copy()}
+
+            frame[y1:y2, x1:x2] = frame_area_inpainted
+            self.update_table_callback(region_id, frame_idx, "")
 
         if flag:
             self.update_table_callback(-1, frame_idx, "")
         # Callbacks handling
-        self.input_frame_callback(frame_before)
-        self.output_frame_callback(frame_after)
+        if due:
+            self.input_frame_callback(frame_before)
+            self.output_frame_callback(self.snapshot(frame))
         print(frame_idx)
 
-        return frame_after
+        return frame
 
     def check_same_frame_with_last(self, region_id, frame_gray):
         """
@@ -333,7 +810,7 @@ class VideoInpainter:
         frame1 = self.last_frame[region_id].pop()
         frame5 = self.last_frame[region_id].popleft()
         self.last_frame[region_id].append(frame1)
-        self.last_frame[region_id].append(frame_gray.copy())
+        self.last_frame[region_id].append(frame_gray)
         if frame1 is None or frame5 is None:
             return False
         score, _ = cv2.quality.QualitySSIM_compute(frame1, frame_gray)
@@ -399,13 +876,11 @@ class VideoInpainter:
     def frame_processor_autosubtitle(
         self, frame_idx: int, frame: np.ndarray
     ) -> np.ndarray:
-        frame_before = frame.copy()
-        frame_after = frame.copy()
-
+        # 自动打轴只分析不修改帧
         flag = True
         for region_id, region in enumerate(self.regions):
             x1, x2, y1, y2 = region["region"]
-            frame_area = frame_after[y1:y2, x1:x2]
+            frame_area = frame[y1:y2, x1:x2]
             if frame_area.size == 0:  # 空选区跳过
                 continue
 
@@ -465,11 +940,12 @@ class VideoInpainter:
         if flag:
             self.update_table_callback(-1, frame_idx, "")
         # Callbacks handling
-        if frame_idx % 10 == 0:
-            self.input_frame_callback(frame_before)
-            self.output_frame_callback(frame_after)
+        if self.preview_due(frame_idx):
+            preview = self.snapshot(frame)
+            self.input_frame_callback(preview)
+            self.output_frame_callback(preview)
         print(frame_idx)
-        return frame_after
+        return frame
 
     def check_same_sentence_with_last(
         self, region_id, frame_copy, noise_threshold=2000
@@ -1,35 +1,33 @@
-import re
 import time
 import json
 import sys
 from pathlib import Path
 
 import cv2
-import numpy as np
 # fmt: off
 from PyQt5.QtWidgets import (
     QGridLayout, QHBoxLayout, QVBoxLayout, QSpacerItem, 
     QApplication, QMainWindow, QWidget, QSplashScreen,
     QLabel, QComboBox, QSpinBox, QMessageBox, QPushButton, QSlider, 
     QFileDialog, QDialog, QProgressDialog, QDialogButtonBox, 
-    QTableWidget, QTableWidgetItem,
+    QTableView, QAbstractItemView,
     QSizePolicy, QAction
 )
 # fmt: on
-from PyQt5.QtCore import Qt, QPoint, QRect, QThread, pyqtSignal
-from PyQt5.QtGui import QFont, QPixmap, QIcon, QImage, QColor, QPainter, QPen
+from PyQt5.QtCore import Qt, QPoint, QRect, QThread, QTimer, pyqtSignal
+from PyQt5.QtGui import QFont, QPixmap, QIcon, QImage, QPainter, QPen
 
+from ass_timeline import load_timeline
+from ffmpeg_tools import EncoderConfig
+from inpaint.lama_manager import lama_manager
 from inpaint_text import Inpainter
 from inpaint_video import VideoInpainter
+from preview import PreviewChannel
+from table_progress import TableProgress
+from timeline import Timeline
+from timeline_model import TimelineModel
 
-# fmt: off
-try:
-    import importlib.metadata
-    importlib.metadata.version("torch")
-    lama_flag = True
-except ImportError as e:
-    lama_flag = False
-# fmt: on
+lama_flag = lama_manager.available()
 
 
 class InfoWindow(QMessageBox):
@@ -160,8 +158,10 @@ class ProgressWindow(QProgressDialog):
     def update_progress(self, value):
         if self._is_canceled:
             return
-        self.setValue(value)
+        self.setValue(int(value))
         if value >= 100 and not self._is_canceled:
+            # QProgressDialog 关闭时会发出 canceled，完成后的关闭不是取消
+            self.canceled.disconnect(self.on_cancel)
             self.close()
             self.end_time = time.time()  # End timing
             msg = f"已完成！耗时: {(self.end_time - self.start_time):.2f} 秒"
@@ -173,19 +173,31 @@ class Worker(QThread):
     test_button = pyqtSignal(bool)
     time_slider = pyqtSignal(bool)
     start_button = pyqtSignal(bool)
-    update_input_frame = pyqtSignal(np.ndarray)
-    update_output_frame = pyqtSignal(np.ndarray)
     update_progress = pyqtSignal(float)
-    update_table = pyqtSignal((int, int, str))
     result_signal = pyqtSignal(object)
 
-    def __init__(self, selected_video_path, selected_regions, inpainter, time_table):
+    PREVIEW_FPS = 5  # 处理过程中预览画面的刷新率
+    TABLE_FLUSH_MS = 250  # 时轴表格进度的刷新间隔
+
+    def __init__(
+        self,
+        selected_video_path,
+        selected_regions,
+        inpainter,
+        time_table,
+        encoder=None,
+        segment_render=False,
+    ):
         super().__init__()
         self.selected_video_path = selected_video_path
         self.selected_regions = selected_regions
         self.inpainter = inpainter
         self.time_table = time_table
         self._is_running = True
+        # 预览帧不经过信号，由主窗口定时从通道中取最新一帧
+        self.preview = PreviewChannel(self.PREVIEW_FPS)
+        # 表格进度同样由主窗口定时批量取走
+        self.table_progress = TableProgress()
 
         self.inpaint_video = VideoInpainter(
             self.selected_video_path,
@@ -193,10 +205,12 @@ class Worker(QThread):
             self.time_table,
             self.inpainter,
             self.update_progress.emit,
-            self.update_input_frame.emit,
-            self.update_output_frame.emit,
-            self.update_table.emit,
-            stop_check=self.stop_check,
+            self.preview.put_input,
+            self.preview.put_output,
+            self.table_progress.mark,
+            segment_render=segment_render,
+            encoder=encoder,
+            preview=self.preview,
         )
 
     def run(self):
@@ -217,6 +231,8 @@ class Worker(QThread):
 
     def stop(self):
         self._is_running = False
+        # 唤醒阻塞中的流水线线程，立即停止
+        self.inpaint_video.cancel()
 
 
 class MainWindowLayout(QMainWindow):
@@ -275,14 +291,16 @@ class MainWindowLayout(QMainWindow):
 
     def setup_subtitle_table(self):
         """下侧时轴表"""
-        self.subtitle_table = QTableWidget()
-        self.subtitle_table.setColumnCount(101)
-        self.subtitle_table.setRowCount(5)
-        self.subtitle_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        # 虚拟模型只为可见单元格生成数据，行列数与视频长度无关
+        self.timeline_model = TimelineModel(self.format_time2, self)
+        self.subtitle_table = QTableView()
+        self.subtitle_table.setModel(self.timeline_model)
+        self.subtitle_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
 
-        for i in range(101):
-            time_label = QTableWidgetItem(f"{i}\n{i//60:02d}:{i%60:02d}.000")
-            self.subtitle_table.setHorizontalHeaderItem(i, time_label)
+        placeholder = Timeline(101)
+        for i in range(5):
+            placeholder.add_row(str(i + 1))
+        self.timeline_model.load(1, placeholder)
 
         self.main_layout.addWidget(self.subtitle_table, 4, 0, 3, 20)
 
@@ -332,9 +350,11 @@ class MainWindowLayout(QMainWindow):
             "INPAINT_FSR_PARA",
             # "INPAINT_FSR_FAST",
             # "INPAINT_FSR_BEST",
+            "INPAINT_FSR_BEST_PARA",
         ]
         if lama_flag:
             algo_list.append("INPAINT_LAMA")
+            algo_list.append("INPAINT_LAMA_INT8")
         self.algorithm_combo.addItems(algo_list)
         control_layout.addWidget(self.algorithm_label)
         control_layout.addWidget(self.algorithm_combo)
@@ -392,10 +412,12 @@ class MainWindow(MainWindowLayout):
         self.video_label_input.mouseMoveEvent = self.update_drawing  # 更新绘制
         self.video_label_input.mouseReleaseEvent = self.end_drawing  # 结束绘制
         self.algorithm_param_button.clicked.connect(self.update_param)  # 更新算法参数
+        self.algorithm_combo.currentTextChanged.connect(self.preload_model)  # 预加载模型
         self.test_button.clicked.connect(self.test)  # 测试图像修复算法
         self.start_button.clicked.connect(self.run)  # 运行修复任务
-        self.subtitle_table.itemSelectionChanged.connect(self.selected_cell)
-        self.subtitle_table.cellDoubleClicked.connect(self.change_state_cell)
+        selection = self.subtitle_table.selectionModel()
+        selection.selectionChanged.connect(self.selected_cell)
+        self.subtitle_table.doubleClicked.connect(self.change_state_cell)
         self.subtitle_table.verticalHeader().sectionClicked.connect(self.select_region)
         self.subtitle_table.verticalHeader().sectionDoubleClicked.connect(
             self.change_region_color
@@ -406,7 +428,6 @@ class MainWindow(MainWindowLayout):
         self.total_frames = 0
         self.fps = 0
         self.video_frame_size = (0, 0)
-        self.table = {}  # 存储时轴表格信息
         self.video_path = ""
         self.subtitle_path = ""
 
@@ -421,11 +442,18 @@ class MainWindow(MainWindowLayout):
 
         # 初始化算法参数
         self.worker_thread = None
+        self.preview_timer = QTimer(self)
+        self.preview_timer.timeout.connect(self.show_preview)
+        self.table_timer = QTimer(self)
+        self.table_timer.timeout.connect(self.flush_table_progress)
         self.stroke_input = 0
         self.x_offset_input = 0
         self.y_offset_input = 0
         self.autosub_input = 0
-        self.inpainter = Inpainter()
+        self.inpainter = None
+        self.encoder = None  # 输出编码参数，None 时使用 mp4v
+        self.segment_render = False  # 只重新编码含有字幕的关键帧区间
+        self.lama_tile_size = None  # LaMa 分块推理的分块边长，None 不分块
         if Path("config.json").exists():
             self.load_config(Path("config.json"))
         else:
@@ -452,13 +480,21 @@ class MainWindow(MainWindowLayout):
                 self.x_offset_input = config["x_offset"]
                 self.y_offset_input = config["y_offset"]
                 self.autosub_input = config["autosub"]
+                lama_manager.set_profile(config.get("lama_profile", "default"))
+                encoder = config.get("encoder")
+                self.encoder = EncoderConfig(**encoder) if encoder else None
+                self.segment_render = config.get("segment_render", False)
+                self.lama_tile_size = config.get("lama_tile_size")
                 self.algorithm_combo.setCurrentText(config["inpaint"])
-                self.inpainter = Inpainter(
-                    method=config["inpaint"],
-                    stroke=self.stroke_input,
-                    x_offset=self.x_offset_input,
-                    y_offset=self.y_offset_input,
-                    autosub=self.autosub_input,
+                self.replace_inpainter(
+                    Inpainter(
+                        method=config["inpaint"],
+                        stroke=self.stroke_input,
+                        x_offset=self.x_offset_input,
+                        y_offset=self.y_offset_input,
+                        autosub=self.autosub_input,
+                        lama_tile_size=self.lama_tile_size,
+                    )
                 )
             except:
                 WarnWindow("配置文件错误，请删除 config.json")
@@ -469,9 +505,14 @@ class MainWindow(MainWindowLayout):
         self.x_offset_input = -2
         self.y_offset_input = -2
         self.autosub_input = 3000
-        self.inpainter = Inpainter(
-            "MASK",
+        self.lama_tile_size = None
+        self.replace_inpainter(
+            Inpainter(
+                "MASK",
+            )
         )
+        self.encoder = None
+        self.segment_render = False
 
     def save_config(self):
         with open("config.json", "w", encoding="utf-8") as f:
@@ -481,6 +522,10 @@ class MainWindow(MainWindowLayout):
                 "x_offset": self.inpainter.x_offset,
                 "y_offset": self.inpainter.y_offset,
                 "autosub": self.autosub_input,
+                "lama_profile": lama_manager.profile,
+                "lama_tile_size": self.lama_tile_size,
+                "encoder": self.encoder._asdict() if self.encoder else None,
+                "segment_render": self.segment_render,
             }
             f.write(json.dumps(config, indent=4, ensure_ascii=False))
 
@@ -502,6 +547,13 @@ class MainWindow(MainWindowLayout):
                 self.autosub_input,
             ) = window.get_values()
 
+    def preload_model(self, method):
+        """
+        选择 LaMa 算法时在后台加载模型，避免首次修复时等待
+        """
+        if method in Inpainter.LAMA_METHODS and lama_flag:
+            lama_manager.load_async(quantized=method == "INPAINT_LAMA_INT8")
+
     # 载入视频文件和时轴文件
     def load_video_file(self, file_name=None):
         """
@@ -573,40 +625,27 @@ class MainWindow(MainWindowLayout):
             if not file_name:
                 return
 
-        with open(file_name, "r", encoding="utf-8") as f:
-            content = f.read()
+        timeline, in_range = load_timeline(file_name, self.fps, self.total_frames)
         self.subtitle_path = file_name
-
-        # 分析字幕文件数据
-        dialogue_list = []
-        for line in content.split("\n"):
-            temp = self.parse_ass_line(line)
-            if temp and temp["Type"] == "Dialogue":
-                temp["Start"] = int(temp["Start"] * self.fps) + 1
-                temp["End"] = int(temp["End"] * self.fps) + 1
-                dialogue_list.append(temp)
-
-        # 整理成时轴表格
-        self.table = {}
-        flag = True
-        for idx, dialogue in enumerate(dialogue_list):
-            title = dialogue["Style"]
-            if title not in self.table:
-                self.table[title] = [None] * self.total_frames
-            for i in range(dialogue["Start"], dialogue["End"]):
-                try:
-                    if self.table[title][i] is None and flag:
-                        self.table[title][i] = (
-                            f"{idx + 1} - {dialogue['Name']}"
-                            if dialogue["Name"]
-                            else f"{idx + 1}"
-                        )
-                except:
-                    ErrorWindow("时轴超过视频范围，请检查时轴")
-                    flag = False
-        self.update_table(self.table)
+        if not in_range:
+            ErrorWindow("时轴超过视频范围，请检查时轴")
+        self.update_table(timeline)
 
     # 图像修复算法相关函数
+    def replace_inpainter(self, inpainter):
+        """
+        替换当前的 Inpainter，并释放旧实例的线程池、进程池和共享内存
+        """
+        old = self.inpainter
+        self.inpainter = inpainter
+        if old is None or old is inpainter:
+            return
+        # 正在处理中的实例等处理结束后在 handle_result 中释放
+        if self.worker_thread and self.worker_thread.isRunning():
+            if self.worker_thread.inpainter is old:
+                return
+        old.close()
+
     def set_inpainter(self):
         return Inpainter(
             self.algorithm_combo.currentText(),
@@ -614,6 +653,7 @@ class MainWindow(MainWindowLayout):
             self.x_offset_input,
             self.y_offset_input,
             self.autosub_input,
+            lama_tile_size=self.lama_tile_size,
         )
 
     def test(self):
@@ -621,7 +661,7 @@ class MainWindow(MainWindowLayout):
         测试图像修复算法，在当前选区内执行图像修复操作
         """
         self.subtitle_table.clearSelection()
-        self.inpainter = self.set_inpainter()
+        self.replace_inpainter(self.set_inpainter())
 
         frame = self.current_frame.copy()
 
@@ -638,10 +678,9 @@ class MainWindow(MainWindowLayout):
             self.update_frame_output(frame)
             return
 
-        # 多选区根据 self.table
-        time_table = list(self.table.values())
+        # 多选区根据时轴表格
         for region_id, region in enumerate(self.selected_regions):
-            if time_table[region_id][self.time_slider.value()] is not None:
+            if self.timeline_model.is_active(region_id, self.time_slider.value()):
                 x1, x2, y1, y2 = self.confirm_region(region["region"])
                 frame_area = frame[y1:y2, x1:x2]
                 if frame_area.size > 0:
@@ -656,7 +695,7 @@ class MainWindow(MainWindowLayout):
         运行图像修复任务，根据选区和字幕表信息批量进行修复
         """
         self.subtitle_table.clearSelection()
-        self.inpainter = self.set_inpainter()
+        self.replace_inpainter(self.set_inpainter())
         self.save_config()
 
         # 启动工作线程
@@ -668,26 +707,37 @@ class MainWindow(MainWindowLayout):
                 }
                 for region in self.selected_regions
             ]
-            time_table = list(self.table.values())
+            time_table = self.timeline_model.time_table()
             self.progress = ProgressWindow()
             self.worker_thread = Worker(
-                self.video_path, regions, self.inpainter, time_table
+                self.video_path,
+                regions,
+                self.inpainter,
+                time_table,
+                self.encoder,
+                self.segment_render,
             )
             self.worker_thread.start_button.connect(self.start_button.setEnabled)
             self.worker_thread.time_slider.connect(self.time_slider.setEnabled)
             self.worker_thread.test_button.connect(self.test_button.setEnabled)
-            self.worker_thread.update_input_frame.connect(self.update_frame_input)
-            self.worker_thread.update_output_frame.connect(self.update_frame_output)
             self.worker_thread.update_progress.connect(self.progress.update_progress)
-            self.worker_thread.update_table.connect(self.complete_cell)
             self.progress.cancel_signal.connect(self.worker_thread.stop)
             self.worker_thread.result_signal.connect(self.handle_result)
+            self.show_preview()
+            self.preview_timer.start(1000 // Worker.PREVIEW_FPS)
+            self.table_timer.start(Worker.TABLE_FLUSH_MS)
             self.worker_thread.start()
 
     def handle_result(self, result):
         """
         处理工作线程返回的结果
         """
+        self.preview_timer.stop()
+        self.table_timer.stop()
+        self.show_preview()
+        self.flush_table_progress()
+        if self.worker_thread.inpainter is not self.inpainter:
+            self.worker_thread.inpainter.close()
         if result["status"] != "Success":
             regions = self.selected_regions.copy()
             if self.video_path:
@@ -737,6 +787,22 @@ class MainWindow(MainWindowLayout):
             ErrorWindow("无法读取视频帧")
             return
 
+    def show_preview(self):
+        """
+        显示预览通道中最新的帧，并把当前显示尺寸告知工作线程用于缩放
+        """
+        if not self.worker_thread:
+            return
+        preview = self.worker_thread.preview
+        preview.resize(
+            (self.video_label_input.width(), self.video_label_input.height())
+        )
+        frame_input, frame_output = preview.take()
+        if frame_input is not None:
+            self.update_frame_input(frame_input)
+        if frame_output is not None:
+            self.update_frame_output(frame_output)
+
     def update_frame_input(self, frame):
         """
         更新输入窗口的视频帧显示
@@ -774,34 +840,23 @@ class MainWindow(MainWindowLayout):
         self.video_label_output.setAlignment(Qt.AlignCenter)
 
     # 表格处理相关
-    def update_table(self, table):
+    def update_table(self, timeline):
         """
-        根据 self.table 更新时轴表格
+        用新的时轴替换表格内容，每行对应一个选区
         """
-        self.subtitle_table.setRowCount(len(table))
-        for i, title in enumerate(table):
-            title_label = QTableWidgetItem(title)
-            self.subtitle_table.setVerticalHeaderItem(i, title_label)
-            for j, text in enumerate(table[title]):
-                if text is not None:
-                    self.set_cell(i, j, QColor("#C5E4FD"), text, QColor("#000000"))
-                else:
-                    self.set_cell(i, j, QColor("#232629"))
+        self.timeline_model.load(self.fps, timeline)
         self.selected_regions = [
-            {"region": QRect(0, 0, 1, 0), "binary": True} for _ in table
+            {"region": QRect(0, 0, 1, 0), "binary": True} for _ in range(len(timeline))
         ]
 
     def init_table(self):
         """
-        打开视频时初始化时轴表格
+        打开视频时初始化时轴表格，默认一行覆盖全部帧
         """
-        self.subtitle_table.setColumnCount(self.total_frames)
-        for i in range(self.total_frames):
-            current_time = i / self.fps
-            time_label = QTableWidgetItem(f"{i}\n{self.format_time2(current_time)}")
-            self.subtitle_table.setHorizontalHeaderItem(i, time_label)
-        self.table = {"default": [" "] * self.total_frames}
-        self.update_table(self.table)
+        timeline = Timeline(self.total_frames, labels=[" "])
+        timeline.add_row("default")
+        timeline.set(0, 0, self.total_frames, 0)
+        self.update_table(timeline)
 
     def roll_table(self, col):
         """
@@ -819,28 +874,17 @@ class MainWindow(MainWindowLayout):
         target_position = max(0, row)
         self.subtitle_table.verticalScrollBar().setValue(target_position)
 
-    def complete_cell(self, row, col, content=""):
+    def flush_table_progress(self):
         """
-        标记字幕表格中的某一单元格，表示对应的帧已经完成图像修复。
+        取走工作线程累积的进度，在一次重绘中标记所有已完成的单元格
         """
-        self.locate_table(row, col)
-        if row > self.subtitle_table.rowCount() - 1:
-            self.subtitle_table.setRowCount(row + 1)
-            self.table[str(row + 1)] = [None] * self.total_frames
-            for j in range(self.total_frames):
-                self.set_cell(row, j, QColor("#232629"))
-        if row > -1:
-            self.set_cell(row, col, QColor("#14445B"), content)
-        self.locate_table(row, col)
-
-    def set_cell(self, row, col, bgcolor, text="", textcolor=QColor("#ffffff")):
-        """设置表格单元格"""
-        item = QTableWidgetItem(text)
-        self.subtitle_table.setItem(row, col, item)
-        item.setBackground(bgcolor)
-        item.setForeground(textcolor)
-        keys = list(self.table.keys())
-        self.table[keys[row]][col] = text
+        if not self.worker_thread:
+            return
+        ranges, position = self.worker_thread.table_progress.flush()
+        for row, start, end, content in ranges:
+            self.timeline_model.mark_done(row, start, end, content)
+        if position is not None:
+            self.locate_table(*position)
 
     def select_region(self, logical_index):
         """
@@ -853,13 +897,13 @@ class MainWindow(MainWindowLayout):
         """
         单元格选中事件
         """
-        selected_items = self.subtitle_table.selectedItems()
+        selected = self.subtitle_table.selectionModel().selectedIndexes()
         # 选中单个单元格跳转
-        if len(selected_items) == 1:
-            item = selected_items[0]
-            self.update_frame(item.column())
-            self.time_slider.setValue(item.column())
-            self.update_time_label(item.column())
+        if len(selected) == 1:
+            column = selected[0].column()
+            self.update_frame(column)
+            self.time_slider.setValue(column)
+            self.update_time_label(column)
 
     def change_region_color(self, logical_index):
         msg_box = QMessageBox(self)
@@ -873,19 +917,10 @@ class MainWindow(MainWindowLayout):
         self.selected_regions[logical_index]["binary"] = binary
         print(f"Row {logical_index} clicked, binary set to {binary}")
 
-    def change_state_cell(self, row, column):
-        item = self.subtitle_table.item(row, column)
-        if item:
-            current_color = item.background().color()
-            color1 = QColor("#C5E4FD")  # 选择
-            color2 = QColor("#232629")  # 未选择
-
-            if current_color == color1:
-                item.setBackground(color2)
-                self.table[list(self.table.keys())[row]][column] = None
-            else:
-                item.setBackground(color1)
-                self.table[list(self.table.keys())[row]][column] = "1"
+    def change_state_cell(self, index):
+        """双击切换单元格是否需要修复"""
+        if index.isValid():
+            self.timeline_model.toggle(index.row(), index.column())
 
     # 绘制红框相关事件
     def start_drawing(self, event):
@@ -1006,33 +1041,6 @@ class MainWindow(MainWindowLayout):
             return 0, video_width - 1, 0, video_height - 1
 
     # 时轴处理相关
-    def parse_ass_line(self, line):
-        """
-        解析字幕文件中的单行内容，提取出时间、字幕等信息。
-        """
-        # Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
-        pattern = r"^(Dialogue|Comment):\s*(\d+),(\d+:\d+:\d+\.\d+),(\d+:\d+:\d+\.\d+),([^,]*),([^,]*),(\d+),(\d+),(\d+),([^,]*),(.*)$"
-
-        match = re.match(pattern, line)
-
-        if match:
-            parsed = {
-                "Type": match.group(1),
-                # "Layer": int(match.group(2)),
-                "Start": self.calSubTime(match.group(3)),
-                "End": self.calSubTime(match.group(4)),
-                "Style": match.group(5),
-                "Name": match.group(6),
-                # "MarginL": int(match.group(7)),
-                # "MarginR": int(match.group(8)),
-                # "MarginV": int(match.group(9)),
-                # "Effect": match.group(10),
-                # "Text": match.group(11),
-            }
-            return parsed
-        else:
-            return None
-
     @staticmethod
     def format_time(seconds):
         """
@@ -1050,20 +1058,6 @@ class MainWindow(MainWindowLayout):
         minutes, seconds = divmod(int(seconds), 60)
         return f"{minutes:02d}:{int(seconds):02d}.{milliseconds:03d}"
 
-    @staticmethod
-    def calSubTime(t):
-        """
-        h:mm:ss.ss -> s
-        """
-        h, m, s = t.split(":")
-        h = int(h)
-        m = int(m)
-        s = float(s)
-
-        total_seconds = h * 3600 + m * 60 + (s - 0.01)
-        total_seconds = max(total_seconds, 0)
-        return total_seconds
-
     def update_time_label(self, frame_number):
         """
         更新上方控制栏时间显示
@@ -1078,10 +1072,16 @@ class MainWindow(MainWindowLayout):
     # 窗口事件
     def closeEvent(self, event):
         """
-        窗口关闭事件，释放视频捕获资源。
+        窗口关闭事件，释放视频捕获资源和修复算法的线程池、进程池。
         """
         if self.cap:
             self.cap.release()
+        if self.worker_thread and self.worker_thread.isRunning():
+            self.worker_thread.stop()
+            self.worker_thread.wait()
+            self.worker_thread.inpainter.close()
+        if self.inpainter is not None:
+            self.inpainter.close()
         super().closeEvent(event)
 
     def resizeEvent(self, event):
@@ -0,0 +1,107 @@
+import queue
+import threading
+from collections import deque
+
+
+class Cancelled(Exception):
+    """流水线已取消，阻塞中的 put / get / wait 抛出此异常"""
+
+
+class CancelEvent:
+    """
+    流水线共享的取消事件
+
+    set 时唤醒所有登记过的条件变量，等待中的线程无需轮询即可立即退出
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._conditions = []
+        self._lock = threading.Lock()
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        return self._event.wait(timeout)
+
+    def register(self, condition: threading.Condition):
+        with self._lock:
+            self._conditions.append(condition)
+
+    def set(self):
+        self._event.set()
+        with self._lock:
+            conditions = list(self._conditions)
+        for condition in conditions:
+            with condition:
+                condition.notify_all()
+
+    def wait_for(self, condition: threading.Condition, predicate):
+        """
+        在已持有 condition 的情况下阻塞直到 predicate() 为真
+
+        Raises:
+            Cancelled: 等待期间或等待前已取消
+        """
+        while not predicate():
+            if self.is_set():
+                raise Cancelled
+            condition.wait()
+        if self.is_set():
+            raise Cancelled
+
+
+class BlockingQueue:
+    """
+    有界阻塞队列，put / get 没有超时轮询，取消时立即抛出 Cancelled
+
+    Args:
+        maxsize: 容量，0 为不限
+        cancel: 共享的取消事件
+    """
+
+    def __init__(self, maxsize: int, cancel: CancelEvent):
+        self.maxsize = maxsize
+        self.cancel = cancel
+        self._items = deque()
+        self._condition = threading.Condition()
+        cancel.register(self._condition)
+
+    def _full(self):
+        return 0 < self.maxsize <= len(self._items)
+
+    def put(self, item):
+        with self._condition:
+            self.cancel.wait_for(self._condition, lambda: not self._full())
+            self._items.append(item)
+            self._condition.notify_all()
+
+    def get(self):
+        with self._condition:
+            self.cancel.wait_for(self._condition, lambda: self._items)
+            item = self._items.popleft()
+            self._condition.notify_all()
+            return item
+
+    def get_nowait(self):
+        with self._condition:
+            if self.cancel.is_set():
+                raise Cancelled
+            if not self._items:
+                raise queue.Empty
+            item = self._items.popleft()
+            self._condition.notify_all()
+            return item
+
+    def drain(self):
+        """取出并返回所有元素，不受取消影响，用于取消后的清理"""
+        with self._condition:
+            items = list(self._items)
+            self._items.clear()
+            self._condition.notify_all()
+            return items
+
+    def qsize(self):
+        with self._condition:
+            return len(self._items)
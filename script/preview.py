@@ -0,0 +1,82 @@
+import threading
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class PreviewChannel:
+    """
+    限速、降采样的预览通道
+
+    处理线程先用 claim() 按墙钟时间申请发送，得到许可后才截取预览，
+    snapshot() 在工作线程中直接缩放到显示尺寸；put_input / put_output 写入单槽缓冲，
+    新帧覆盖未取走的旧帧。UI 线程定时调用 take() 取走最新一帧，
+    预览开销只与 max_fps 有关，与视频帧率无关
+
+    Args:
+        max_fps: 每秒最多发送的预览帧数
+        size: 显示区域尺寸 (宽, 高)，None 时不缩放
+    """
+
+    def __init__(self, max_fps: float = 5.0, size: Optional[Tuple[int, int]] = None):
+        self.interval = 1.0 / max_fps
+        self.size = size
+        self._next_time = 0.0
+        self._input = None
+        self._output = None
+        self._lock = threading.Lock()
+
+    def resize(self, size: Tuple[int, int]) -> None:
+        """更新显示区域尺寸，由 UI 线程在显示区域变化时调用"""
+        self.size = size
+
+    def claim(self) -> bool:
+        """到达发送时间时返回 True 并占用本次发送，并发调用中只有一个得到 True"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_time:
+                return False
+            self._next_time = now + self.interval
+            return True
+
+    def snapshot(self, frame: np.ndarray) -> np.ndarray:
+        """
+        预览用的帧副本，按比例缩小到 size 以内，不放大
+
+        Args:
+            frame: 原始帧，之后可以被修改或复用
+
+        Returns:
+            与 frame 不共享内存的缩略图
+        """
+        size = self.size
+        height, width = frame.shape[:2]
+        if size is None or size[0] <= 0 or size[1] <= 0:
+            return frame.copy()
+        scale = min(size[0] / width, size[1] / height)
+        if scale >= 1:
+            return frame.copy()
+        dsize = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return cv2.resize(frame, dsize, interpolation=cv2.INTER_AREA)
+
+    def put_input(self, frame: np.ndarray) -> None:
+        with self._lock:
+            self._input = frame
+
+    def put_output(self, frame: np.ndarray) -> None:
+        with self._lock:
+            self._output = frame
+
+    def take(self):
+        """
+        取走最新的预览帧
+
+        Returns:
+            (输入帧, 输出帧)，自上次 take 以来没有更新的一侧为 None
+        """
+        with self._lock:
+            frames = (self._input, self._output)
+            self._input = self._output = None
+        return frames
@@ -0,0 +1,83 @@
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+# 子进程中的状态，由 init_worker 设置
+_worker = {}
+
+
+class FrameRing:
+    """
+    预分配的共享内存帧槽
+
+    读取线程把帧解码进空闲槽位，处理进程原地修复，写入线程从槽位写出后归还，
+    帧数据在进程间只通过槽位编号传递，不经过 pickle
+    """
+
+    def __init__(self, slots, shape, dtype=np.uint8, name=None):
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        nbytes = slots * int(np.prod(self.shape)) * self.dtype.itemsize
+
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.frames = np.ndarray(
+            (slots, *self.shape), dtype=self.dtype, buffer=self.shm.buf
+        )
+
+    def spec(self):
+        return self.shm.name, self.slots, self.shape, self.dtype.str
+
+    @classmethod
+    def attach(cls, spec):
+        name, slots, shape, dtype = spec
+        return cls(slots, shape, dtype, name)
+
+    def release(self):
+        """关闭映射，创建者同时释放共享内存"""
+        if self.shm is None:
+            return
+        self.frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+        self.shm = None
+
+
+def init_worker(ring_spec, inpainter, regions):
+    """处理进程初始化：映射帧槽，保存修复器和选区"""
+    cv2.setNumThreads(1)  # 并行度由进程数决定，避免线程过度订阅
+    _worker["ring"] = FrameRing.attach(ring_spec)
+    _worker["inpainter"] = inpainter
+    _worker["regions"] = regions
+
+
+def process_frame(slot, active_regions):
+    """
+    在子进程中原地修复槽位中的帧
+
+    Args:
+        slot: 帧槽编号
+        active_regions: 当前帧需要修复的选区编号
+
+    Returns:
+        实际修复的选区编号
+    """
+    frame = _worker["ring"].frames[slot]
+    inpainter = _worker["inpainter"]
+    done = []
+    for region_id in active_regions:
+        region = _worker["regions"][region_id]
+        x1, x2, y1, y2 = region["region"]
+        frame_area = frame[y1:y2, x1:x2]
+        if frame_area.size == 0:  # 空选区跳过
+            continue
+        frame_area_inpainted, _ = inpainter.inpaint_text(frame_area, region["binary"])
+        frame[y1:y2, x1:x2] = frame_area_inpainted
+        done.append(region_id)
+    return done
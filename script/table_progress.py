@@ -0,0 +1,72 @@
+import threading
+from typing import List, NamedTuple, Optional, Tuple
+
+
+class CellRange(NamedTuple):
+    """时轴表格一行中连续、内容相同的已完成帧 [start, end)"""
+
+    row: int
+    start: int
+    end: int
+    content: str
+
+
+class TableProgress:
+    """
+    合并时轴表格的逐帧进度更新
+
+    处理线程每个选区每帧调用一次 mark()，同一行相邻且内容相同的帧合并为区间；
+    UI 线程定时调用 flush() 取走批次，一次性应用到表格，
+    Qt 事件数量只与刷新频率有关，与帧数和选区数无关
+    """
+
+    def __init__(self):
+        self._rows = {}  # {row: [[start, end, content]]}
+        self._position = None  # 最近一次更新的 (row, col)，用于滚动表格
+        self._lock = threading.Lock()
+
+    def mark(self, row: int, col: int, content: str = "") -> None:
+        """
+        记录一帧的完成状态，签名与 VideoInpainter 的 update_table_callback 一致
+
+        Args:
+            row: 选区编号，-1 表示该帧没有需要修复的选区，只更新滚动位置
+            col: 帧号
+            content: 单元格文本
+        """
+        with self._lock:
+            self._position = (row, col)
+            if row < 0:
+                return
+            runs = self._rows.setdefault(row, [])
+            last = runs[-1] if runs else None
+            if last is not None and last[1] == col and last[2] == content:
+                last[1] = col + 1
+            else:
+                runs.append([col, col + 1, content])
+
+    def flush(self) -> Tuple[List[CellRange], Optional[Tuple[int, int]]]:
+        """
+        取走自上次 flush 以来的更新
+
+        Returns:
+            (按行、帧号排序并合并后的区间, 最近一次更新的 (row, col))，
+            没有更新时分别为 [] 和 None
+        """
+        with self._lock:
+            rows, self._rows = self._rows, {}
+            position, self._position = self._position, None
+
+        ranges = []
+        for row in sorted(rows):
+            # 多个处理线程乱序完成时区间可能不相邻，排序后再合并一次
+            runs = sorted(rows[row])
+            start, end, content = runs[0]
+            for run_start, run_end, run_content in runs[1:]:
+                if run_start == end and run_content == content:
+                    end = run_end
+                    continue
+                ranges.append(CellRange(row, start, end, content))
+                start, end, content = run_start, run_end, run_content
+            ranges.append(CellRange(row, start, end, content))
+        return ranges, position
@@ -0,0 +1,247 @@
+import heapq
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class Timeline:
+    """
+    区间形式的时轴：每行 (选区) 一组按起点排序、互不重叠的帧区间 [start, end)，
+    每个区间带有字幕文本编号。存储与字幕行数成正比，与视频帧数无关
+
+    单行查询用二分查找，O(log n)；next_change 对整批帧号向量化求下一个变化点
+
+    Args:
+        frame_count: 视频帧数
+        titles: 行标题
+        rows: 每行的 (starts, ends, ids) 数组
+        labels: 字幕文本，ids 中的编号指向这里
+    """
+
+    def __init__(
+        self,
+        frame_count: int,
+        titles: Sequence[str] = (),
+        rows: Sequence[Tuple[np.ndarray, np.ndarray, np.ndarray]] = (),
+        labels: Sequence[str] = (),
+    ):
+        self.frame_count = frame_count
+        self.titles = list(titles)
+        self.labels = list(labels)
+        # 文本 -> 编号，重复的文本取第一个，与 labels.index 一致
+        self._label_ids = {}
+        for i, text in enumerate(self.labels):
+            self._label_ids.setdefault(text, i)
+        self.starts, self.ends, self.ids = [], [], []
+        for starts, ends, ids in rows:
+            self.starts.append(np.asarray(starts, np.int64))
+            self.ends.append(np.asarray(ends, np.int64))
+            self.ids.append(np.asarray(ids, np.int32))
+        self._boundaries = None
+
+    @classmethod
+    def from_ids(
+        cls,
+        frame_count: int,
+        titles: Sequence[str],
+        id_rows: Sequence[np.ndarray],
+        labels: Sequence[str] = (),
+    ) -> "Timeline":
+        """由每帧的字幕编号数组 (-1 为不需要修复) 构建，相邻且编号相同的帧合并为区间"""
+        return cls(frame_count, titles, [runs(ids) for ids in id_rows], labels)
+
+    @classmethod
+    def from_frames(cls, frame_rows: Sequence[Sequence]) -> "Timeline":
+        """由旧的逐帧列表 time_table[row][frame] 构建，真值帧视为需要修复"""
+        frame_count = max([len(row) for row in frame_rows], default=0)
+        id_rows = []
+        for row in frame_rows:
+            ids = np.full(frame_count, -1, np.int32)
+            active = np.fromiter(map(bool, row), bool, len(row))
+            ids[: len(row)] = np.where(active, 0, -1)
+            id_rows.append(ids)
+        titles = [str(i + 1) for i in range(len(frame_rows))]
+        return cls.from_ids(frame_count, titles, id_rows, ["1"])
+
+    @classmethod
+    def from_spans(
+        cls,
+        frame_count: int,
+        spans: Dict[str, List[Tuple[int, int, int]]],
+        labels: Sequence[str],
+    ) -> "Timeline":
+        """
+        由每行的 (start, end, 字幕编号) 列表构建，重叠部分保留列表中靠前的一项，
+        超出 [0, frame_count) 的部分截断
+
+        Args:
+            spans: {行标题: [(start, end, id)]}，按优先级排列
+        """
+        rows = [paint(row_spans, frame_count) for row_spans in spans.values()]
+        return cls(frame_count, list(spans), rows, labels)
+
+    def copy(self) -> "Timeline":
+        rows = [
+            (s.copy(), e.copy(), i.copy())
+            for s, e, i in zip(self.starts, self.ends, self.ids)
+        ]
+        return Timeline(self.frame_count, self.titles, rows, self.labels)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def label_id(self, text: str) -> int:
+        """返回文本的编号，不存在时添加"""
+        label = self._label_ids.get(text)
+        if label is None:
+            label = len(self.labels)
+            self.labels.append(text)
+            self._label_ids[text] = label
+        return label
+
+    def add_row(self, title: str) -> None:
+        """在末尾添加一行没有任何区间的行"""
+        self.titles.append(title)
+        self.starts.append(np.zeros(0, np.int64))
+        self.ends.append(np.zeros(0, np.int64))
+        self.ids.append(np.zeros(0, np.int32))
+
+    def label_at(self, row: int, frame: int) -> int:
+        """frame 所在区间的字幕编号，不需要修复时为 -1"""
+        i = np.searchsorted(self.starts[row], frame, "right") - 1
+        if i >= 0 and frame < self.ends[row][i]:
+            return int(self.ids[row][i])
+        return -1
+
+    def is_active(self, row: int, frame: int) -> bool:
+        return self.label_at(row, frame) >= 0
+
+    def active(self, frame: int) -> List[int]:
+        """frame 需要修复的行"""
+        return [row for row in range(len(self.titles)) if self.is_active(row, frame)]
+
+    def active_mask(self, row: Optional[int] = None) -> np.ndarray:
+        """
+        每帧是否需要修复
+
+        Args:
+            row: 行号，None 时为任意一行需要修复
+        """
+        rows = range(len(self.titles)) if row is None else [row]
+        delta = np.zeros(self.frame_count + 1, np.int32)
+        for r in rows:
+            np.add.at(delta, self.starts[r], 1)
+            np.add.at(delta, self.ends[r], -1)
+        return np.cumsum(delta[:-1]) > 0
+
+    def boundaries(self) -> np.ndarray:
+        """所有行的区间端点，排序去重，即任一行状态可能变化的帧"""
+        if self._boundaries is None:
+            points = self.starts + self.ends + [np.array([self.frame_count])]
+            self._boundaries = np.unique(np.concatenate(points))
+        return self._boundaries
+
+    def next_change(self, frames):
+        """
+        frames 之后第一个任一行状态可能变化的帧，没有时为 frame_count
+
+        Args:
+            frames: 帧号或帧号数组
+
+        Returns:
+            与 frames 形状相同
+        """
+        boundaries = self.boundaries()
+        i = np.searchsorted(boundaries, frames, "right")
+        return boundaries[np.minimum(i, len(boundaries) - 1)]
+
+    def set(self, row: int, start: int, end: int, label: int) -> None:
+        """
+        把一行的 [start, end) 设为字幕编号 label，-1 为清除
+
+        只替换与 [start, end) 重叠或相接的区间 [lo, hi)，其余区间不变。
+        替换后区间数不变时 (如延长最后一个区间) 原地修改，否则拼接前后两段
+        """
+        if start >= end:
+            return
+        starts, ends, ids = self.starts[row], self.ends[row], self.ids[row]
+        lo = int(np.searchsorted(ends, start, "left"))
+        hi = int(np.searchsorted(starts, end, "right"))
+        # 受影响的区间裁剪为两侧剩余部分，相接的区间整个保留，参与合并
+        pieces = []
+        if lo < hi and starts[lo] < start:
+            pieces.append((starts[lo], start, ids[lo]))
+        if label >= 0:
+            pieces.append((start, end, label))
+        if lo < hi and ends[hi - 1] > end:
+            pieces.append((end, ends[hi - 1], ids[hi - 1]))
+        new_starts, new_ends, new_ids = merge_runs(
+            np.array([p[0] for p in pieces], np.int64),
+            np.array([p[1] for p in pieces], np.int64),
+            np.array([p[2] for p in pieces], np.int32),
+        )
+        if len(new_starts) == hi - lo:
+            starts[lo:hi], ends[lo:hi], ids[lo:hi] = new_starts, new_ends, new_ids
+        else:
+            self.starts[row] = np.concatenate((starts[:lo], new_starts, starts[hi:]))
+            self.ends[row] = np.concatenate((ends[:lo], new_ends, ends[hi:]))
+            self.ids[row] = np.concatenate((ids[:lo], new_ids, ids[hi:]))
+        self._boundaries = None
+
+
+def runs(ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """把每帧的编号数组压缩为 (starts, ends, ids)，忽略 -1"""
+    ids = np.asarray(ids)
+    if len(ids) == 0:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0, np.int32)
+    change = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+    starts = np.concatenate(([0], change))
+    ends = np.append(change, len(ids))
+    values = ids[starts]
+    keep = values >= 0
+    return starts[keep], ends[keep], values[keep]
+
+
+def paint(
+    spans: Sequence[Tuple[int, int, int]], frame_count: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    把可能重叠的 (start, end, id) 列表整理为不重叠的区间，重叠部分保留列表中靠前的一项
+
+    按端点扫描，用最小堆维护覆盖当前位置的区间，O(n log n)，与帧数无关
+    """
+    clipped = []
+    for priority, (start, end, label) in enumerate(spans):
+        start, end = max(start, 0), min(end, frame_count)
+        if start < end:
+            clipped.append((start, end, priority, label))
+    clipped.sort()
+    points = sorted({p for start, end, _, _ in clipped for p in (start, end)})
+
+    starts, ends, ids = [], [], []
+    heap = []  # [(priority, end, id)]
+    i = 0
+    for point, next_point in zip(points, points[1:]):
+        while i < len(clipped) and clipped[i][0] == point:
+            _, end, priority, label = clipped[i]
+            heapq.heappush(heap, (priority, end, label))
+            i += 1
+        while heap and heap[0][1] <= point:
+            heapq.heappop(heap)
+        if heap:
+            starts.append(point)
+            ends.append(next_point)
+            ids.append(heap[0][2])
+    return merge_runs(
+        np.array(starts, np.int64), np.array(ends, np.int64), np.array(ids, np.int32)
+    )
+
+
+def merge_runs(starts, ends, ids):
+    """合并首尾相接且编号相同的相邻区间，输入按起点排序"""
+    if len(starts) < 2:
+        return starts, ends, ids
+    joined = (starts[1:] == ends[:-1]) & (ids[1:] == ids[:-1])
+    first = np.append(True, ~joined)
+    last = np.append(~joined, True)
+    return starts[first], ends[last], ids[first]
@@ -0,0 +1,119 @@
+from typing import Callable
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PyQt5.QtGui import QColor
+
+from timeline import Timeline
+
+
+class TimelineModel(QAbstractTableModel):
+    """
+    时轴表格的虚拟模型：行为选区（字幕样式），列为帧
+
+    需要修复的帧和已完成修复的帧都以 Timeline 区间保存，
+    视图只为可见单元格调用 data()，每次查询为一次二分查找，
+    加载和滚动耗时与视频长度无关
+
+    Args:
+        time_format: 秒 -> 列标题中显示的时间
+    """
+
+    ACTIVE_BG = QColor("#C5E4FD")  # 需要修复
+    INACTIVE_BG = QColor("#232629")  # 不需要修复
+    DONE_BG = QColor("#14445B")  # 已完成修复
+    ACTIVE_FG = QColor("#000000")
+    DEFAULT_FG = QColor("#ffffff")
+
+    def __init__(self, time_format: Callable[[float], str], parent=None):
+        super().__init__(parent)
+        self.time_format = time_format
+        self.fps = 0
+        self.timeline = Timeline(0)
+        # 已完成修复的帧，区间编号指向完成时显示的文本
+        self.done = Timeline(0)
+
+    def load(self, fps: float, timeline: Timeline) -> None:
+        """
+        替换全部数据
+
+        Args:
+            fps: 视频帧率，用于列标题
+            timeline: 时轴，列数为 timeline.frame_count
+        """
+        self.beginResetModel()
+        self.fps = fps
+        self.timeline = timeline
+        self.done = Timeline(timeline.frame_count)
+        for title in timeline.titles:
+            self.done.add_row(title)
+        self.endResetModel()
+
+    def add_row(self, title: str) -> None:
+        """在末尾添加一行全部不需要修复的行"""
+        row = len(self.timeline)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.timeline.add_row(title)
+        self.done.add_row(title)
+        self.endInsertRows()
+
+    def is_active(self, row: int, col: int) -> bool:
+        return self.timeline.is_active(row, col)
+
+    def toggle(self, row: int, col: int) -> None:
+        """切换单元格是否需要修复"""
+        label = -1 if self.is_active(row, col) else self.timeline.label_id("1")
+        self.timeline.set(row, col, col + 1, label)
+        index = self.index(row, col)
+        self.dataChanged.emit(index, index)
+
+    def mark_done(self, row: int, start: int, end: int, content: str = "") -> None:
+        """标记一行的 [start, end) 帧已完成修复，行不存在时补齐"""
+        while row >= len(self.timeline):
+            self.add_row(str(len(self.timeline) + 1))
+        self.done.set(row, start, end, self.done.label_id(content))
+        self.dataChanged.emit(self.index(row, start), self.index(row, end - 1))
+
+    def time_table(self) -> Timeline:
+        """时轴的副本，作为 VideoInpainter 的 time_table 参数，处理中修改表格不受影响"""
+        return self.timeline.copy()
+
+    # QAbstractTableModel 接口
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.timeline)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.timeline.frame_count
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, col = index.row(), index.column()
+        done = self.done.label_at(row, col)
+        label = self.timeline.label_at(row, col)
+
+        if role == Qt.DisplayRole:
+            if done >= 0:
+                return self.done.labels[done]
+            return self.timeline.labels[label] if label >= 0 else ""
+        if role == Qt.BackgroundRole:
+            if done >= 0:
+                return self.DONE_BG
+            return self.ACTIVE_BG if label >= 0 else self.INACTIVE_BG
+        if role == Qt.ForegroundRole:
+            if done < 0 and label >= 0:
+                return self.ACTIVE_FG
+            return self.DEFAULT_FG
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Vertical:
+            titles = self.timeline.titles
+            return titles[section] if section < len(titles) else None
+        if self.fps:
+            return f"{section}\n{self.time_format(section / self.fps)}"
+        return str(section)
+
+    def flags(self, index):
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable